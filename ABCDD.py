@@ -14,19 +14,23 @@ class AbstractDD(DD, ABC):
             result.append((i, arr[i]))
         return result
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, parallel=1):
+        super().__init__(parallel=parallel)
 
     def reduce_lo_tokens(self, lo_tokens: List[Any], skip_tests=False, retry_count=0, max_retries=5):
         indexed = AbstractDD.add_index(lo_tokens)
         self.skip_test = skip_tests
+        self.prepare_tokens(lo_tokens)
         if not skip_tests:
             if self._test([]) != self.PASS:
                 raise Exception(f"Expect empty test to not pass")
             if self._test(indexed) == self.PASS:
                 raise Exception(f"Expect original input to pass")
         try:
-            return self.join_tokens(list(map(lambda a: a[1], self.ddmin(indexed))))
+            reduced = self.join_config(self.ddmin(indexed))
+            print(f"Outcome cache: {len(self.outcome_cache)} entries, "
+                  f"{self.outcome_cache.memory_usage()} bytes")
+            return reduced
         except AssertionError as e:
             if skip_tests and retry_count < max_retries:
                 traceback.print_exception(e)
@@ -44,8 +48,16 @@ class AbstractDD(DD, ABC):
     def test_joined(self, joined) -> bool:
         pass
 
+    def prepare_tokens(self, lo_tokens: List[Any]):
+        """Called with the whole input before the reduction starts"""
+        pass
+
+    def join_config(self, c):
+        """Join a configuration, a list of (index, token)"""
+        return self.join_tokens([token for _, token in c])
+
     def _test(self, c):
-        if self.test_joined(self.join_tokens(list(map(lambda a: a[1], c)))):
+        if self.test_joined(self.join_config(c)):
             return self.FAIL
         return self.PASS
 
@@ -59,4 +71,7 @@ if __name__ == '__main__':
             return 'rl' in joined
 
     sdd = StringDD()
-    sdd.reduce_lo_tokens("hello world")
\ No newline at end of file
+    sdd.reduce_lo_tokens("hello world")
+
+    psdd = StringDD(parallel=4)
+    assert psdd.reduce_lo_tokens("hello world") == sdd.reduce_lo_tokens("hello world")
\ No newline at end of file
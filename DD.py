@@ -41,89 +41,109 @@
 # Andreas Zeller
 
 
+import concurrent.futures
+import sys
+
+
 # Start with some helpers.
 class OutcomeCache:
     # This class holds test outcomes for configurations.  This avoids
     # running the same test twice.
 
-    # The outcome cache is implemented as a tree.  Each node points
-    # to the outcome of the remaining list.
+    # The outcome cache is implemented as a hash table keyed by bitsets.
+    # Each distinct element is assigned a bit the first time it is
+    # seen; a configuration is then the frozenset of its bit positions.
     #
     # Example: ([1, 2, 3], PASS), ([1, 2], FAIL), ([1, 4, 5], FAIL):
     #
-    #      (2, FAIL)--(3, PASS)
-    #     /
-    # (1, None)
-    #     \
-    #      (4, None)--(5, FAIL)
-    
+    #   bits     = {1: 0, 2: 1, 3: 2, 4: 3, 5: 4}
+    #   outcomes = {{0, 1, 2}: PASS, {0, 1}: FAIL, {0, 3, 4}: FAIL}
+    #
+    # Building a key costs O(len(C)), however many elements were seen
+    # before, and exact lookups are a single hash probe.  Subset and
+    # superset queries scan the stored keys with set comparisons.
+
     def __init__(self):
-        self.tail = {}                  # Points to outcome of tail
-        self.result = None              # Result so far
+        self.bits = {}                  # Element -> bit position
+        self.outcomes = {}              # Bitset -> result
+
+    def key(self, c, add=False):
+        """Return the bitset for C, or None if C holds an element that
+        was never added (and ADD is false)."""
+        positions = []
+        for delta in c:
+            bit = self.bits.get(delta)
+            if bit is None:
+                if not add:
+                    return None
+                bit = len(self.bits)
+                self.bits[delta] = bit
+            positions.append(bit)
+        return frozenset(positions)
 
     def add(self, c, result):
         """Add (C, RESULT) to the cache.  C must be a list of scalars."""
-        cs = c[:]
-        cs.sort()
-
-        p = self
-        for start in range(len(c)):
-            if c[start] not in p.tail:
-                p.tail[c[start]] = OutcomeCache()
-            p = p.tail[c[start]]
-            
-        p.result = result
+        self.outcomes[self.key(c, add=True)] = result
 
     def lookup(self, c):
         """Return RESULT if (C, RESULT) is in the cache; None, otherwise."""
-        p = self
-        for start in range(len(c)):
-            if c[start] not in p.tail:
-                return None
-            p = p.tail[c[start]]
-
-        return p.result
+        k = self.key(c)
+        if k is None:
+            return None
+        return self.outcomes.get(k)
 
-    def lookup_superset(self, c, start = 0):
+    def lookup_superset(self, c, result=None):
         """Return RESULT if there is some (C', RESULT) in the cache with
-        C' being a superset of C or equal to C.  Otherwise, return None."""
-
-        # FIXME: Make this non-recursive!
-        if start >= len(c):
-            if self.result:
-                return self.result
-            elif self.tail != {}:
-                # Select some superset
-                superset = self.tail[list(self.tail.keys())[0]]
-                return superset.lookup_superset(c, start + 1)
-            else:
-                return None
-
-        if c[start] in self.tail:
-            return self.tail[c[start]].lookup_superset(c, start + 1)
-
-        # Let K0 be the largest element in TAIL such that K0 <= C[START]
-        k0 = None
-        for k in list(self.tail.keys()):
-            if (k0 == None or k > k0) and k <= c[start]:
-                k0 = k
-
-        if k0 != None:
-            return self.tail[k0].lookup_superset(c, start)
-        
-        return None
-
-    def lookup_subset(self, c):
+        C' being a superset of C or equal to C.  Otherwise, return None.
+        If RESULT is given, only entries with that outcome are considered.
+        The smallest such superset is preferred."""
+        k = self.key(c)
+        if k is None:
+            # Nothing stored can contain an unseen element
+            return None
+
+        best, best_size = None, None
+        for other, other_result in self.outcomes.items():
+            if not k <= other:
+                continue
+            if result is not None and other_result != result:
+                continue
+            size = len(other)
+            if best_size is None or size < best_size:
+                best, best_size = other_result, size
+        return best
+
+    def lookup_subset(self, c, result=None):
         """Return RESULT if there is some (C', RESULT) in the cache with
-        C' being a subset of C or equal to C.  Otherwise, return None."""
-        p = self
-        for start in range(len(c)):
-            if c[start] in p.tail:
-                p = p.tail[c[start]]
-
-        return p.result
-        
-        
+        C' being a subset of C or equal to C.  Otherwise, return None.
+        If RESULT is given, only entries with that outcome are considered.
+        The largest such subset is preferred."""
+        # Unseen elements of C cannot be in any stored subset
+        k = self.key([delta for delta in c if delta in self.bits])
+
+        best, best_size = None, None
+        for other, other_result in self.outcomes.items():
+            if not other <= k:
+                continue
+            if result is not None and other_result != result:
+                continue
+            size = len(other)
+            if best_size is None or size > best_size:
+                best, best_size = other_result, size
+        return best
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def memory_usage(self):
+        """Return the approximate size of the cache in bytes.  The bit
+        positions in the keys are the objects held by BITS."""
+        size = sys.getsizeof(self.bits) + sys.getsizeof(self.outcomes)
+        for delta, bit in self.bits.items():
+            size += sys.getsizeof(delta) + sys.getsizeof(bit)
+        for k, result in self.outcomes.items():
+            size += sys.getsizeof(k) + sys.getsizeof(result)
+        return size
 
 
 # Test the outcome cache
@@ -165,13 +185,21 @@ def oc_test():
     assert oc.lookup_subset([]) == 0
     assert oc.lookup_subset([1, 2, 3]) == 4
     assert oc.lookup_subset([1, 2, 3, 4]) == 4
-    assert oc.lookup_subset([1, 3]) == None
+    assert oc.lookup_subset([1, 3]) == 0
     assert oc.lookup_subset([1, 2]) == 3
 
-    assert oc.lookup_subset([-5, 1]) == None
+    assert oc.lookup_subset([-5, 1]) == 0
     assert oc.lookup_subset([-5, 1, 2]) == 3
     assert oc.lookup_subset([-5]) == 0
 
+    assert oc.lookup_superset([1], 4) == 4
+    assert oc.lookup_superset([6], 4) == None
+    assert oc.lookup_subset([1, 2, 3], 3) == 3
+    assert oc.lookup_subset([5, 6, 7], 4) == None
+
+    assert len(oc) == 4
+    assert oc.memory_usage() > 0
+
 
 # Main Delta Debugging algorithm.
 class DD:
@@ -209,7 +237,7 @@ class DD:
     debug_split     = 0
     debug_resolve   = 0
 
-    def __init__(self, skip_test=True):
+    def __init__(self, skip_test=True, parallel=1):
         self.__resolving = 0
         self.__last_reported_length = 0
         self.monotony = 0
@@ -219,6 +247,11 @@ class DD:
         self.maximize = 1
         self.assume_axioms_hold = 1
         self.skip_test = skip_test
+        self.parallel = parallel        # Number of tests in flight during ddmin
+        self.__executor = None
+        self.__pending = {}             # Started tests, keyed by configuration
+        self.__queued = {}              # Tests waiting for a free worker
+        self.__orphans = {}             # Cancelled tests that are still running
 
     # Helpers
     def __listminus(self, c1, c2):
@@ -289,6 +322,32 @@ class DD:
         """Test the configuration C.  Return PASS, FAIL, or UNRESOLVED"""
         c.sort()
 
+        cached_result = self.__cached_outcome(c)
+        if cached_result != None:
+            return cached_result
+
+        if self.debug_test:
+            print()
+            print("test(" + self.coerce(c) + ")...")
+
+        future = self.__take(tuple(c))
+        if future is not None:
+            # Started ahead of time by __prefetch(); wait for it
+            outcome = future.result()
+        else:
+            outcome = self._test(c)
+
+        if self.debug_test:
+            print("test(" + self.coerce(c) + ") = " + repr(outcome))
+
+        if self.cache_outcomes:
+            self.outcome_cache.add(c, outcome)
+
+        return outcome
+
+    def __cached_outcome(self, c):
+        """Return the outcome of the sorted configuration C if the
+        outcome cache already tells it; None, otherwise."""
         # If we had this test before, return its result
         if self.cache_outcomes:
             cached_result = self.outcome_cache.lookup(c)
@@ -297,33 +356,110 @@ class DD:
 
         if self.monotony:
             # Check whether we had a passing superset of this test before
-            cached_result = self.outcome_cache.lookup_superset(c)
+            cached_result = self.outcome_cache.lookup_superset(c, self.PASS)
             if cached_result == self.PASS:
                 return self.PASS
             
-            cached_result = self.outcome_cache.lookup_subset(c)
+            cached_result = self.outcome_cache.lookup_subset(c, self.FAIL)
             if cached_result == self.FAIL:
                 return self.FAIL
 
-        if self.debug_test:
-            print()
-            print("test(" + self.coerce(c) + ")...")
-
-        outcome = self._test(c)
-
-        if self.debug_test:
-            print("test(" + self.coerce(c) + ") = " + repr(outcome))
-
-        if self.cache_outcomes:
-            self.outcome_cache.add(c, outcome)
-
-        return outcome
+        return None
 
     def _test(self, c):
         """Stub to overload in subclasses"""
         return self.UNRESOLVED                # Placeholder
 
 
+    # Parallel testing
+    def __prefetch(self, cs):
+        """Test all configurations in CS in the background, at most
+        PARALLEL at a time.  Results are picked up in order by test();
+        whatever is not picked up is dropped by __cancel_pending()."""
+        if self.parallel <= 1:
+            return
+        if self.__executor is None:
+            self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel)
+
+        for c in cs:
+            c = sorted(c)
+            key = tuple(c)
+            if key in self.__pending or key in self.__queued or key in self.__orphans:
+                continue
+            if self.__cached_outcome(c) != None:
+                continue
+            self.__queued[key] = c
+        self.__fill()
+
+    def __in_flight(self):
+        """Return the running tests.  Cancelled tests hold their worker
+        until they finish; their outcomes still go to the outcome cache."""
+        for key, future in list(self.__orphans.items()):
+            if future.done():
+                del self.__orphans[key]
+                self.__add_finished(key, future)
+        return ([future for future in self.__pending.values() if not future.done()] +
+                list(self.__orphans.values()))
+
+    def __fill(self):
+        """Start queued tests, in order, while a worker is free."""
+        while self.__queued and len(self.__in_flight()) < self.parallel:
+            key = next(iter(self.__queued))
+            c = self.__queued.pop(key)
+            # An earlier outcome may tell this one by now
+            if self.__cached_outcome(c) == None:
+                self.__pending[key] = self.__executor.submit(self._test, c)
+
+    def __take(self, key):
+        """Return the finished background test of configuration KEY,
+        or None if it was never prefetched."""
+        if key in self.__orphans:
+            self.__pending[key] = self.__orphans.pop(key)
+        c = self.__queued.pop(key, None)
+        if c is not None:
+            # Start it next, as soon as a worker is free
+            in_flight = self.__in_flight()
+            while len(in_flight) >= self.parallel:
+                concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                in_flight = self.__in_flight()
+            self.__pending[key] = self.__executor.submit(self._test, list(c))
+
+        future = self.__pending.get(key)
+        if future is None:
+            return None
+        # Keep the workers busy while waiting
+        while not future.done():
+            concurrent.futures.wait(self.__in_flight(), return_when=concurrent.futures.FIRST_COMPLETED)
+            self.__fill()
+        del self.__pending[key]
+        self.__fill()
+        return future
+
+    def __add_finished(self, key, future):
+        if self.cache_outcomes and future.exception() is None:
+            self.outcome_cache.add(list(key), future.result())
+
+    def __cancel_pending(self):
+        """Cancel outstanding tests.  Tests that already finished are
+        still added to the outcome cache."""
+        for key, future in self.__pending.items():
+            if future.cancel():
+                continue
+            if future.done():
+                self.__add_finished(key, future)
+            else:
+                self.__orphans[key] = future
+        self.__pending = {}
+        self.__queued = {}
+
+    def __shutdown_executor(self):
+        self.__cancel_pending()
+        self.__orphans = {}
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False, cancel_futures=True)
+            self.__executor = None
+
+
     # Splitting
     def split(self, c, n):
         """Split C into [C_1, C_2, ..., C_n]."""
@@ -603,7 +739,10 @@ class DD:
         if self.debug_dd:
             print(("dd(" + self.pretty(c) + ", " + repr(n) + ")..."))
 
-        outcome = self._dd(c, n)
+        try:
+            outcome = self._dd(c, n)
+        finally:
+            self.__shutdown_executor()
 
         if self.debug_dd:
             print(("dd(" + self.pretty(c) + ", " + repr(n) + ") = " + repr(outcome)))
@@ -648,6 +787,13 @@ class DD:
             next_c = c[:]
             next_n = n
 
+            if self.parallel > 1 and not self.maximize:
+                # Send all subsets, then all complements, to the worker
+                # pool at once.  The loops below still consume the
+                # outcomes in order, so the first failing one wins.
+                self.__prefetch(cs + [self.__listminus(c, cs[(j + cbar_offset) % n])
+                                      for j in range(n)])
+
             # Check subsets
             for i in range(n):
                 if self.debug_dd:
@@ -698,6 +844,9 @@ class DD:
                         cbar_offset = i
                         break
 
+            # Outcomes past the winner are of no use any more
+            self.__cancel_pending()
+
             if not c_failed and not cbar_failed:
                 if n >= len(c):
                     # No further minimizing
@@ -0,0 +1,222 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Set, Tuple
+
+from ABCDD import AbstractDD
+
+# Tokens that carry no syntax and are attached to the following token
+TRIVIA = {'WS'}
+OPEN = {'LPAREN', 'LBRACK'}
+CLOSE = {'RPAREN', 'RBRACK'}
+# Tokens that continue a unit after its closing brace, e.g. "} else {" or "};"
+CONTINUATIONS = {'ELSE', 'CATCH', 'FINALLY', 'SEMI', 'COMMA', 'DOT', 'RPAREN'}
+
+
+@dataclass(eq=False, repr=False)
+class Unit:
+    """A node of the syntax tree. A token has text (including the whitespace and comments before it),
+    any other unit is the concatenation of its children. Units hash by identity."""
+    text: str = ''
+    children: List['Unit'] = field(default_factory=list)
+    kind: str = ''
+
+    def __repr__(self):
+        return repr(self.render(set()))
+
+    def is_token(self) -> bool:
+        return not self.children
+
+    def render(self, removed: Set['Unit']) -> str:
+        if self in removed:
+            return ''
+        if self.is_token():
+            return self.text
+        return ''.join(child.render(removed) for child in self.children)
+
+
+def merge_atoms(tokens: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], str]:
+    """Merge Java8Lexer tokens into atoms: whitespace and comments are attached to the next token,
+    and string and character literals become single atoms (the lexer splits them).
+    Returns the atoms and the trailing trivia."""
+    atoms = list()
+    trivia = ''
+    i = 0
+    n = len(tokens)
+    while i < n:
+        kind, text = tokens[i]
+        if kind in TRIVIA:
+            trivia += text
+            i += 1
+        elif kind == 'COMMENT_START':
+            j = i
+            while j < n and tokens[j][0] != 'COMMENT_END':
+                j += 1
+            trivia += ''.join(t for _, t in tokens[i:j + 1])
+            i = j + 1
+        elif kind == 'LINE_COMMENT_START':
+            j = i
+            while j < n and not (tokens[j][0] == 'WS' and '\n' in tokens[j][1]):
+                j += 1
+            trivia += ''.join(t for _, t in tokens[i:j])
+            i = j
+        elif kind in ('DoubleQuote', 'SingleQuote'):
+            j = i + 1
+            while j < n and tokens[j][0] != kind and not (tokens[j][0] == 'WS' and '\n' in tokens[j][1]):
+                j += 2 if tokens[j][0] == 'ESCAPE' else 1
+            j = min(j, n - 1)
+            atoms.append(('LITERAL', trivia + ''.join(t for _, t in tokens[i:j + 1])))
+            trivia = ''
+            i = j + 1
+        else:
+            atoms.append((kind, trivia + text))
+            trivia = ''
+            i += 1
+    return atoms, trivia
+
+
+def parse_units(atoms: List[Tuple[str, str]], pos: int = 0, in_block: bool = False) -> Tuple[List[Unit], int]:
+    """Split ATOMS from POS into units: a unit ends with a ';' or with the '}' closing its block,
+    and the units inside a block become children of the unit that opens it.
+    Stops after the '}' closing the enclosing block if IN_BLOCK."""
+    units = list()
+    current = list()
+    nesting = 0
+    while pos < len(atoms):
+        kind, text = atoms[pos]
+        if kind == 'RBRACE' and nesting == 0 and in_block:
+            break
+        current.append(Unit(text, kind=kind))
+        pos += 1
+        if kind in OPEN or (kind == 'LBRACE' and nesting > 0):
+            nesting += 1
+        elif kind in CLOSE or (kind == 'RBRACE' and nesting > 0):
+            nesting = max(0, nesting - 1)
+        elif kind == 'SEMI' and nesting == 0:
+            units.append(Unit(children=current))
+            current = list()
+        elif kind == 'LBRACE':
+            body, pos = parse_units(atoms, pos, in_block=True)
+            current.extend(body)
+            if pos < len(atoms):
+                current.append(Unit(atoms[pos][1], kind='RBRACE'))
+                pos += 1
+            following = atoms[pos][0] if pos < len(atoms) else None
+            continues = following in CONTINUATIONS or (following == 'WHILE' and current[0].kind == 'DO')
+            if not continues:
+                units.append(Unit(children=current))
+                current = list()
+    if current:
+        units.append(Unit(children=current))
+    return units, pos
+
+
+def build_tree(tokens: List[Tuple[str, str]]) -> Unit:
+    atoms, trailing = merge_atoms(tokens)
+    units, _ = parse_units(atoms)
+    if trailing:
+        units.append(Unit(trailing, kind='TRIVIA'))
+    return Unit(children=units)
+
+
+class HDD:
+    """Hierarchical delta debugging (Misherghi and Su) over the syntax tree of a Java snippet.
+
+    Reduces top-down: first the top-level units (types and statements), then the
+    units nested one block deeper (members), and so on down to the innermost
+    statements. Each level is reduced with ddmin; removing a unit removes
+    everything nested in it. With TOKEN_LEVEL the Java tokens of what is left
+    are reduced last; otherwise the caller reduces the leaves (e.g. with ddmin
+    over the model's tokens, which also splits identifiers).
+    TEST_JOINED gets the rendered code and returns True if the failure is still present.
+    """
+
+    def __init__(self, test_joined: Callable[[str], bool], parallel=1, token_level=False):
+        self.test_joined = test_joined
+        self.parallel = parallel
+        self.token_level = token_level
+        self.tests = 0
+        self.lock = threading.Lock()
+
+    def count_test(self, joined: str) -> bool:
+        # Called from the worker threads of parallel ddmin
+        with self.lock:
+            self.tests += 1
+        return self.test_joined(joined)
+
+    @staticmethod
+    def units_at_level(root: Unit, level: int, removed: Set[Unit]) -> List[Unit]:
+        """Units LEVEL blocks deep that are still present; level None selects the tokens."""
+        found = list()
+
+        def visit(unit: Unit, depth: int):
+            for child in unit.children:
+                if child in removed:
+                    continue
+                if level is None:
+                    if child.is_token():
+                        found.append(child)
+                    else:
+                        visit(child, depth)
+                elif not child.is_token():
+                    if depth == level:
+                        found.append(child)
+                    else:
+                        visit(child, depth + 1)
+
+        visit(root, 0)
+        return found
+
+    def reduce_level(self, root: Unit, units: List[Unit], removed: Set[Unit]) -> None:
+        hdd = self
+
+        class LevelDD(AbstractDD):
+            def join_tokens(self, kept: List[Unit]):
+                kept = set(kept)
+                return root.render(removed | {u for u in units if u not in kept})
+
+            def test_joined(self, joined) -> bool:
+                return hdd.count_test(joined)
+
+        kept = {unit for _, unit in LevelDD(parallel=self.parallel).ddmin(AbstractDD.add_index(units))}
+        removed.update(u for u in units if u not in kept)
+
+    def reduce_tree(self, root: Unit) -> str:
+        removed: Set[Unit] = set()
+        level = 0
+        while True:
+            units = self.units_at_level(root, level, removed)
+            if not units:
+                break
+            self.reduce_level(root, units, removed)
+            level += 1
+        if self.token_level:
+            tokens = [u for u in self.units_at_level(root, None, removed) if u.kind != 'TRIVIA']
+            if tokens:
+                self.reduce_level(root, tokens, removed)
+        return root.render(removed)
+
+    def reduce(self, code: str, tokens: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Reduce CODE, tokenized with Java8Lexer unless TOKENS are given.
+        Code the lexer cannot reproduce exactly is returned unchanged."""
+        if tokens is None:
+            from antlr_tokenize import tokenize
+            tokens = tokenize(code)
+        if ''.join(text for _, text in tokens) != code:
+            return code
+        return self.reduce_tree(build_tree(tokens))
+
+
+if __name__ == '__main__':
+    code = """class A {
+    int unused;
+    void f() {
+        String s = "}";
+        if (s.isEmpty()) { s = null; } else { g(); }
+    }
+    void g() { List<String> l = new ArrayList<>(); }
+}
+"""
+    hdd = HDD(lambda joined: 'List<String>' in joined, token_level=True)
+    reduced = hdd.reduce(code)
+    print(f"{hdd.tests} tests: {reduced}")
+    assert 'List<String>' in reduced and 'unused' not in reduced
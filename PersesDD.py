@@ -0,0 +1,130 @@
+import heapq
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from ABCDD import AbstractDD
+from HDD import Unit, build_tree
+
+# Statements that can be replaced by the statements nested in them, e.g. "if (c) { a; }" by "a;"
+HOISTABLE = {'IF', 'ELSE', 'FOR', 'WHILE', 'DO', 'TRY', 'SYNCHRONIZED', 'LBRACE', 'STATIC'}
+
+
+class PersesDD:
+    """Syntax-guided reduction in the style of Perses (Sun et al.), in process.
+
+    Works on the unit tree of HDD.py (types, members, statements). Units are
+    visited largest first from a priority queue. For every unit the list of
+    units nested in it is reduced with ddmin, and a compound statement (if,
+    for, while, try, blocks, ...) is replaced by the statements nested in it.
+    Passes repeat until a fixpoint. Without a full Java grammar, the
+    transformations are limited to these two kinds; Perses also replaces
+    expressions by compatible sub-expressions.
+    TEST_JOINED gets the rendered code and returns True if the failure is still present.
+    """
+
+    def __init__(self, test_joined: Callable[[str], bool], parallel=1):
+        self.test_joined = test_joined
+        self.parallel = parallel
+        self.tests = 0
+        self.lock = threading.Lock()
+        self.removed: Set[Unit] = set()
+        self.hoisted: Dict[Unit, List[Unit]] = dict()
+
+    def count_test(self, joined: str) -> bool:
+        # Called from the worker threads of parallel ddmin
+        with self.lock:
+            self.tests += 1
+        return self.test_joined(joined)
+
+    def children(self, unit: Unit) -> List[Unit]:
+        children = self.hoisted.get(unit, unit.children)
+        return [child for child in children if child not in self.removed]
+
+    def render(self, unit: Unit, removed: Set[Unit] = frozenset()) -> str:
+        if unit in removed or unit in self.removed:
+            return ''
+        if unit.is_token():
+            return unit.text
+        return ''.join(self.render(child, removed) for child in self.hoisted.get(unit, unit.children))
+
+    def size(self, unit: Unit) -> int:
+        if unit.is_token():
+            return 1
+        return sum(self.size(child) for child in self.children(unit))
+
+    def reduce_list(self, root: Unit, units: List[Unit]) -> bool:
+        """Remove the units that are not needed from UNITS with ddmin."""
+        reducer = self
+
+        class ListDD(AbstractDD):
+            def join_tokens(self, kept: List[Unit]):
+                kept = set(kept)
+                return reducer.render(root, {u for u in units if u not in kept})
+
+            def test_joined(self, joined) -> bool:
+                return reducer.count_test(joined)
+
+        kept = {unit for _, unit in ListDD(parallel=self.parallel).ddmin(AbstractDD.add_index(units))}
+        removed = [u for u in units if u not in kept]
+        self.removed.update(removed)
+        return bool(removed)
+
+    def hoist(self, root: Unit, unit: Unit) -> bool:
+        """Replace a compound statement by the statements nested in it."""
+        first = next((child for child in self.children(unit) if child.is_token()), None)
+        nested = [child for child in self.children(unit) if not child.is_token()]
+        if first is None or first.kind not in HOISTABLE or not nested:
+            return False
+        self.hoisted[unit] = nested
+        if self.count_test(self.render(root)):
+            return True
+        del self.hoisted[unit]
+        return False
+
+    def reduce_tree(self, root: Unit) -> str:
+        counter = itertools.count()
+        changed = True
+        while changed:
+            changed = False
+            queue: List[Tuple[int, int, Unit]] = [(-self.size(root), next(counter), root)]
+            while queue:
+                _, _, unit = heapq.heappop(queue)
+                if unit is not root and self.hoist(root, unit):
+                    changed = True
+                nested = [child for child in self.children(unit) if not child.is_token()]
+                if nested and self.reduce_list(root, nested):
+                    changed = True
+                for child in self.children(unit):
+                    if not child.is_token():
+                        heapq.heappush(queue, (-self.size(child), next(counter), child))
+        return self.render(root)
+
+    def reduce(self, code: str, tokens: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Reduce CODE, tokenized with Java8Lexer unless TOKENS are given.
+        Code the lexer cannot reproduce exactly is returned unchanged."""
+        if tokens is None:
+            from antlr_tokenize import tokenize
+            tokens = tokenize(code)
+        if ''.join(text for _, text in tokens) != code:
+            return code
+        self.removed = set()
+        self.hoisted = dict()
+        return self.reduce_tree(build_tree(tokens))
+
+
+if __name__ == '__main__':
+    code = """class A {
+    int unused;
+    void f() {
+        if (x) {
+            for (int i = 0; i < 3; i++) { List<String> l = new ArrayList<>(); }
+        }
+        g();
+    }
+}
+"""
+    perses = PersesDD(lambda joined: 'List<String>' in joined and 'class' in joined)
+    reduced = perses.reduce(code)
+    print(f"{perses.tests} tests: {reduced}")
+    assert 'List<String>' in reduced and 'unused' not in reduced and 'for' not in reduced
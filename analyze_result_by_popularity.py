@@ -2,18 +2,18 @@
 
 import os
 
-from analyze_simple_name_stattypeso import process_files_precision_recall
+from analyze_simple_name_stattypeso import precision_recall_by_group
+from import_metrics import bin_groups
 from compare_results import get_java_files
-from java_import_util import remove_import_file
+from corpus_index import remove_import_file
+from fqn_count_index import load_fqn_counts
 
-from typing import Dict
-
-fqn_mapping_cache = None
+from typing import Dict, List
 
 def parse_fqn_file(file_path):
-    global fqn_mapping_cache
     """
     Parses a file with lines of the format: `fqn_count[<fqn>] = <number>`.
+    The counts are kept in the FQN count index, so a file is only parsed once.
 
     Args:
         file_path (str): Path to the file to parse.
@@ -21,65 +21,37 @@ def parse_fqn_file(file_path):
     Returns:
         dict: A dictionary mapping FQN names (str) to their corresponding numbers (int).
     """
-    if fqn_mapping_cache is not None:
-        return fqn_mapping_cache
-
-    fqn_mapping = {}
-
     try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                if line.startswith("fqn_count[") and "] = " in line:
-                    # Extract the part inside the square brackets
-                    start_idx = line.index("[") + 1
-                    end_idx = line.index("]")
-                    fqn = line[start_idx:end_idx]
-
-                    # Extract the number after the equal sign
-                    num_part = line.split("= ")[1].strip()
-                    number = int(num_part)
-
-                    # Add to the mapping
-                    fqn_mapping[fqn] = number
+        return load_fqn_counts(file_path).to_dict()
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
-    except ValueError as ve:
-        print(f"Error while processing file: {ve}")
-
-    fqn_mapping_cache = fqn_mapping
-    return fqn_mapping
-
+        return {}
 
 
 def get_recalls_by_popularity(input_folder: str, fixed_folder: str, popularity_map: Dict[str, int], bins=None):
     if bins is None:
         bins = [0,100,1000,10000,100000]
-    if len(bins) <= 1:
-        raise Exception('Needs to be larger than 1 bin')
-    java_files = get_java_files(input_folder)
-    for java_file in java_files:
-        input_path = os.path.join(input_folder, java_file)
-        fixed_path = os.path.join(fixed_folder, java_file)
-        if not os.path.exists(fixed_path):
-            print("Output file not found: " + fixed_path)
-            continue
-
-    results = list()
-
-    limit_fs = list()
-    for i in range(0, len(bins) - 1):
-        rare_limit_start = bins[i]
-        rare_limit_end = bins[i+1]
-        limit_fs.append((f"[{rare_limit_start},{rare_limit_end})",lambda t, rare_limit_start=rare_limit_start, rare_limit_end=rare_limit_end: t[1] < rare_limit_end and t[1] >= rare_limit_start))
-    limit_fs.append((f">={rare_limit_end}", lambda t, rare_limit_end=rare_limit_end: t[1] >= rare_limit_end))
-    for name, limit_f in limit_fs:
-        rare_fqns = list(map(lambda t: t[0], filter(limit_f, popularity_map.items())))
-        correct, recommended, expected = process_files_precision_recall(input_folder, fixed_folder, rare_fqns)
-        # precision = correct / recommended
-        # recall = correct / expected
-        results.append((name, correct, expected, rare_fqns))
-
-    return results
+    return get_recalls_by_popularity_bins(input_folder, fixed_folder, popularity_map, [bins])[0]
+
+def get_recalls_by_popularity_bins(input_folder: str, fixed_folder: str, popularity_map: Dict[str, int], bin_sets: List[List[int]]):
+    """get_recalls_by_popularity for each list of bins in BIN_SETS, all from one pass over the files"""
+    for bins in bin_sets:
+        if len(bins) <= 1:
+            raise Exception('Needs to be larger than 1 bin')
+    all_rare_fqns = [bin_groups(popularity_map.items(), bins) for bins in bin_sets]
+    counts = iter(precision_recall_by_group(input_folder, fixed_folder, [fqns for groups in all_rare_fqns for fqns in groups]))
+
+    all_results = list()
+    for bins, groups in zip(bin_sets, all_rare_fqns):
+        names = [f"[{bins[i]},{bins[i+1]})" for i in range(0, len(bins) - 1)] + [f">={bins[-1]}"]
+        results = list()
+        for name, rare_fqns in zip(names, groups):
+            correct, recommended, expected = next(counts)
+            # precision = correct / recommended
+            # recall = correct / expected
+            results.append((name, correct, expected, rare_fqns))
+        all_results.append(results)
+    return all_results
 
 def filtered_result(boa_result_path, input_folder) -> Dict[str, int]:
     java_files = get_java_files(input_folder)
@@ -90,13 +62,14 @@ def filtered_result(boa_result_path, input_folder) -> Dict[str, int]:
         no_import_str, imported_fqns = remove_import_file(input_path)
         all_imports.update(imported_fqns)
 
-    popularity_mapping = parse_fqn_file(boa_result_path)
+    try:
+        popularity_mapping = load_fqn_counts(boa_result_path).lookup(all_imports)
+    except FileNotFoundError:
+        print(f"Error: File '{boa_result_path}' not found.")
+        popularity_mapping = dict()
     filtered_mapping = dict()
     for fqn in all_imports:
-        if fqn in popularity_mapping:
-            filtered_mapping[fqn] = popularity_mapping[fqn]
-            continue
-        filtered_mapping[fqn] = 0
+        filtered_mapping[fqn] = popularity_mapping.get(fqn, 0)
     return filtered_mapping
 
 import matplotlib.pyplot as plt
@@ -9,6 +9,8 @@ import re
 import shutil
 from typing import Dict, List, Any
 
+from java_import_util import IGNORED_IMPORT, ImportClassifier
+
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
@@ -23,15 +25,17 @@ def ns_to_str(ns: int) -> str:
 import_groups = ['android.', 'java.', 'org.joda.time.', '.gwt.', 'org.hibernate.', 'com.thoughtworks.xstream.']
 
 
+import_classifier = ImportClassifier(IGNORED_IMPORT, import_groups)
+
+
 def group_imports_by_lib(imports: List[str]) -> Dict[str, List[str]]:
     grouped_imports = dict()
     for group in import_groups:
         grouped_imports[group] = []
     for imp in imports:
-        for group in import_groups:
-            if group in imp:
-                grouped_imports[group].append(imp)
-                break
+        group = import_classifier.group(imp)
+        if group is not None:
+            grouped_imports[group].append(imp)
     return grouped_imports
 
 
@@ -5,7 +5,8 @@ from typing import Tuple, List
 
 import matplotlib.pyplot as plt
 
-from java_import_util import remove_import_file, match_import, filter_ignored_imports
+from java_import_util import match_import, filter_ignored_imports
+from corpus_index import remove_import_file
 
 def get_java_files(input_folder):
     return [f for f in os.listdir(input_folder) if f.endswith('.java')]
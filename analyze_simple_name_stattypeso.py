@@ -7,8 +7,10 @@ from collections import Counter
 
 import matplotlib.pyplot as plt
 
-from java_import_util import remove_import_file, match_import, filter_ignored_imports
-from compare_results import get_import_statements, filter_stattype, filter_ignored_imports, expand_star, divide
+from java_import_util import match_import
+from corpus_index import remove_import_file
+from compare_results import get_import_statements, filter_imports, expand_star, divide
+from import_metrics import ImportMatrix, bin_groups
 
 def get_java_files(input_folder):
     return [f for f in os.listdir(input_folder) if f.endswith('.java')]
@@ -31,44 +33,20 @@ def get_fqns_stattypeso(snippet_path: str) -> List[str]:
     input_code, imports = remove_import_file(snippet_path)
     return list(imports)
 
-def process_files_precision_recall(input_folder: str, output_folder: str, filter_name):
+def precision_recall_by_group(input_folder: str, output_folder: str, fqn_groups: List[List[str]]) -> List[Tuple[int, int, int]]:
+    """(correct, recommended, expected) for each group of FQNs, with the expected imports limited to the group.
+    All groups come from one pass over the files."""
     if not os.path.exists(output_folder) or not os.listdir(output_folder):
         print("Output folder not found")
-        return 0, 0, 0
+        return [(0, 0, 0)] * len(fqn_groups)
 
     # Precision = correct / recommended
     # Recall = correct / expected
-    correct_import = 0
-    recommended_import = 0
-    expected_import = 0
-    recall_output_arr = list()
-    precision_output_arr = list()
-    csv_rows = list()
+    counts = ImportMatrix(input_folder, output_folder, filter_imports).counts_by_group(fqn_groups)
+    return [(int(correct), counts['recommended'], int(expected)) for correct, expected in zip(counts['correct'], counts['expected'])]
 
-    java_files = get_java_files(input_folder)
-    for java_file in java_files:
-        input_path = os.path.join(input_folder, java_file)
-        output_path = os.path.join(output_folder, java_file)
-        if not os.path.exists(output_path):
-            print("Output file not found: " + output_path)
-            continue
-
-        expected, actual = get_import_statements(input_path, output_path)
-        expected = set(filter_stattype(filter_ignored_imports(list(set(expected)))))
-        actual = set(filter_stattype(filter_ignored_imports(list(set(actual)))))
-        actual = expand_star(actual, expected)
-        expected = list(filter(lambda x: x in filter_name, expected))
-        match = set(match_import(actual, expected))
-        expected_import = expected_import + len(expected)
-        correct_import = correct_import + len(match)
-        recommended_import = recommended_import + len(actual)
-        if len(set(expected)) == 0:
-            continue
-        recall_output_arr.append(divide(len(match), len(set(expected))))
-        precision_output_arr.append(divide(len(match), len(set(actual))))
-        csv_rows.append([f'{java_file}', f'{len(match)}', f'{len(actual)}', f'{len(set(expected))}'])
-
-    return correct_import, recommended_import, expected_import
+def process_files_precision_recall(input_folder: str, output_folder: str, filter_name):
+    return precision_recall_by_group(input_folder, output_folder, [filter_name])[0]
 
 def count_fqns(input_folder: str) -> Counter:
     fqn_counts = Counter()
@@ -83,25 +61,15 @@ def count_fqns(input_folder: str) -> Counter:
     return fqn_counts
 
 def get_recalls(input_folder: str, fixed_folder: str, rare_limit_max=6):
-    java_files = get_java_files(input_folder)
-    for java_file in java_files:
-        input_path = os.path.join(input_folder, java_file)
-        fixed_path = os.path.join(fixed_folder, java_file)
-        if not os.path.exists(fixed_path):
-            print("Output file not found: " + fixed_path)
-            continue
-
     fqn_counts = count_fqns(input_folder)
 
     results = list()
 
-    limit_fs = list()
-    for rare_limit in range(1, rare_limit_max):
-        limit_fs.append((f"{rare_limit}",lambda t, rare_limit=rare_limit: t[1] == rare_limit))
-    limit_fs.append((f">{rare_limit_max-1}", lambda t, rare_limit_max=rare_limit_max: t[1] >= rare_limit_max))
-    for name, limit_f in limit_fs:
-        rare_fqns = list(map(lambda t: t[0], filter(limit_f, fqn_counts.most_common())))
-        correct, recommended, expected = process_files_precision_recall(input_folder, fixed_folder, rare_fqns)
+    # FQNs seen 1, 2, ... rare_limit_max-1 times, and more often
+    names = [f"{rare_limit}" for rare_limit in range(1, rare_limit_max)] + [f">{rare_limit_max-1}"]
+    all_rare_fqns = bin_groups(fqn_counts.most_common(), range(1, rare_limit_max + 1))
+    counts = precision_recall_by_group(input_folder, fixed_folder, all_rare_fqns)
+    for name, rare_fqns, (correct, recommended, expected) in zip(names, all_rare_fqns, counts):
         # precision = correct / recommended
         # recall = correct / expected
         results.append((name, correct, expected, rare_fqns, fqn_counts))
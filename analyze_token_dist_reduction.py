@@ -21,7 +21,9 @@ matplotlib.rcParams.update({
 })
 
 from reduction import read_lines
-from java_import_util import remove_import, remove_import_file
+from java_import_util import remove_import
+from corpus_index import remove_import_file
+import corpus_index
 from tokenize_llm import get_decoder, Tokenizer
 from compare_results import read_file
 from analyze_simple_name_in_snippet import fqn_to_simple_name
@@ -57,7 +59,7 @@ def encode_files_in_folder(folder_path, tokenizer, remove_imports=False, v0_path
             if remove_imports:
                 content, expected = remove_import(read_lines(content))
             # Encode the content using the tokenizer
-            encoded_content = tokenizer.encode(content)
+            encoded_content = corpus_index.encode(tokenizer, content)
 
             # Identify simple names
             if v0_path is not None:
@@ -175,6 +177,7 @@ def count_simplename_frequencies_folder(orignal_folder_path: str, reduced_folder
 
 def count_reduction_token_ratio_folder(original_folder_path: str, reduced_folder_path: str, tokenizer: Tokenizer):
     reduce_ratios = dict()
+    pairs = dict()
     # Iterate over each file in the folder
     for filename in os.listdir(reduced_folder_path):
         if not filename.endswith(".java"):
@@ -197,7 +200,11 @@ def count_reduction_token_ratio_folder(original_folder_path: str, reduced_folder
         reduced_str = read_file(reduced_file_path)
         # original_str = read_file(original_file_path)
         original_str, _ = remove_import_file(original_file_path)
-        reduce_ratios[filename] = len(tokenizer.encode(reduced_str)) / len(tokenizer.encode(original_str))
+        pairs[filename] = (reduced_str, original_str)
+    # Encode all files at once, the tokenizer can spread the batch over threads
+    encoded = corpus_index.encode_batch(tokenizer, [code for pair in pairs.values() for code in pair])
+    for i, filename in enumerate(pairs):
+        reduce_ratios[filename] = len(encoded[2 * i]) / len(encoded[2 * i + 1])
     return reduce_ratios
 
 def count_reduction_ratio_folder(original_folder_path: str, reduced_folder_path: str):
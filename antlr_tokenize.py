@@ -1,19 +1,62 @@
 #!/usr/bin/env python
 
+import concurrent.futures
+import os
 import sys
+import threading
+from array import array
 
-from typing import Tuple, List, Any
+from typing import Dict, Iterator, List, NamedTuple, Tuple
 
+from antlr4 import Token
 from Java8Lexer import Java8Lexer, InputStream
 
+TOKENIZE_JOBS = int(os.getenv('TOKENIZE_JOBS', str(os.cpu_count() or 1)))
+
+# Idle lexers of each thread. The DFA cache lives on the Java8Lexer class and
+# fills up as inputs are lexed; reusing a lexer also keeps its prediction
+# context cache and saves building the ATN simulator for every input.
+_local = threading.local()
+
+
+class TokenArrays(NamedTuple):
+    """The tokens of one input: types, and offsets instead of copied text.
+    Token i is the type Java8Lexer.symbolicNames[types[i]] and the text input_code[starts[i]:ends[i]]."""
+    types: array
+    starts: array
+    ends: array
+
+    def tokens(self, input_code: str) -> List[Tuple[str, str]]:
+        names = Java8Lexer.symbolicNames
+        return [(names[type], input_code[start:end]) for type, start, end in zip(self.types, self.starts, self.ends)]
 
-def tokenize(input_code: str) -> List[Tuple[str, str]]:
-    tokens: List[Tuple[str, str]] = list()
-    lexer = Java8Lexer(InputStream(input_code))
 
-    for token in lexer.getAllTokens():
-        tokens.append((Java8Lexer.symbolicNames[token.type], token.text))
-    return tokens
+def lex(input_code: str) -> Iterator[Tuple[int, int, int]]:
+    """(type, start, end) of each token of INPUT_CODE, lexed as they are consumed"""
+    lexers = getattr(_local, 'lexers', None)
+    if lexers is None:
+        lexers = _local.lexers = list()
+    # A lexer per unfinished generator, so interleaved streams do not share one
+    lexer = lexers.pop() if lexers else Java8Lexer(None)
+    try:
+        lexer.inputStream = InputStream(input_code)
+        token = lexer.nextToken()
+        while token.type != Token.EOF:
+            yield token.type, token.start, token.stop + 1
+            token = lexer.nextToken()
+    finally:
+        lexer.inputStream = None
+        lexers.append(lexer)
+
+
+def stream(input_code: str) -> Iterator[Tuple[str, str]]:
+    names = Java8Lexer.symbolicNames
+    for type, start, end in lex(input_code):
+        yield names[type], input_code[start:end]
+
+
+def tokenize(input_code: str) -> List[Tuple[str, str]]:
+    return list(stream(input_code))
 
 def tokenize_file(file_name: str) -> List[Tuple[str, str]]:
     with open(file_name, "r", encoding="utf-8") as file:
@@ -21,17 +64,56 @@ def tokenize_file(file_name: str) -> List[Tuple[str, str]]:
     return tokenize(input_code)
 
 
+def tokenize_arrays(input_code: str) -> TokenArrays:
+    result = TokenArrays(array('H'), array('I'), array('I'))
+    for type, start, end in lex(input_code):
+        result.types.append(type)
+        result.starts.append(start)
+        result.ends.append(end)
+    return result
+
+def tokenize_arrays_file(file_name: str) -> TokenArrays:
+    with open(file_name, "r", encoding="utf-8") as file:
+        input_code = file.read()
+    return tokenize_arrays(input_code)
+
+
+def tokenize_batch(inputs: List[str], jobs=TOKENIZE_JOBS) -> List[List[Tuple[str, str]]]:
+    """tokenize of each input, on a process pool. The workers send back TokenArrays,
+    which are small to pickle, and the texts are sliced from the inputs here."""
+    if jobs <= 1 or len(inputs) <= 1:
+        return list(map(tokenize, inputs))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(tokenize_arrays, inputs, chunksize=max(1, len(inputs) // (jobs * 4)))
+        return [result.tokens(input_code) for input_code, result in zip(inputs, results)]
+
+def tokenize_folder(folder: str, jobs=TOKENIZE_JOBS) -> Dict[str, TokenArrays]:
+    """TokenArrays of every Java file in FOLDER, by file name, on a process pool"""
+    files = sorted(f for f in os.listdir(folder) if f.endswith('.java'))
+    paths = [os.path.join(folder, f) for f in files]
+    if jobs <= 1:
+        return dict(zip(files, map(tokenize_arrays_file, paths)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        return dict(zip(files, executor.map(tokenize_arrays_file, paths, chunksize=max(1, len(paths) // (jobs * 4)))))
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Tokenize Java 8 source code.")
     parser.add_argument("file", nargs="?", type=argparse.FileType("r"), default=sys.stdin,
                         help="Java source file to tokenize (defaults to stdin)")
+    parser.add_argument("--folder", help="Tokenize every Java file in this folder instead, and print their token counts")
+    parser.add_argument("--jobs", type=int, default=TOKENIZE_JOBS, help="Processes for --folder")
     args = parser.parse_args()
 
+    if args.folder:
+        for file_name, result in tokenize_folder(args.folder, args.jobs).items():
+            print(f'{file_name}: {len(result.types)}')
+        return
+
     input_code = args.file.read()
-    tokens = tokenize(input_code)
-    for type, text in tokens:
+    for type, text in stream(input_code):
         print(f'{type}: {text}')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
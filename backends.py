@@ -0,0 +1,66 @@
+import sys
+from typing import Callable, Dict, NamedTuple
+
+
+class Backend(NamedTuple):
+    # (model_name, api_key, timeout, attempt) -> function from code to the model's response
+    add_import: Callable[[str, str, float, int], Callable[[str], str]]
+    # model_name -> function preparing the model for the next file
+    reload: Callable[[str], Callable[[], None]]
+
+
+# Each backend imports its client library only when it is first used, so an entry point
+# pays only for the backend it runs.
+
+def openai_add_import(model_name, api_key, timeout, attempt=0):
+    from infer_openai import add_import_statements
+    return lambda code: add_import_statements(model_name, api_key, code, timeout=timeout, attempt=attempt)
+
+
+def ollama_add_import(model_name, api_key, timeout, attempt=0):
+    from infer_ollama import add_import_statements
+    return lambda code: add_import_statements(model_name, code, timeout=timeout, attempt=attempt)
+
+
+def ollama_reload(model_name):
+    from infer_ollama import reload_model
+    return lambda: reload_model(model_name)
+
+
+def snr_add_import(model_name, api_key, timeout, attempt=0):
+    from infer_snr import add_import_statements
+    return lambda code: add_import_statements(code, timeout=timeout, attempt=attempt)
+
+
+def no_reload(model_name):
+    return lambda: None
+
+
+BACKENDS: Dict[str, Backend] = {
+    'gpt-4o': Backend(openai_add_import, no_reload),
+    'gpt-4o-mini': Backend(openai_add_import, no_reload),
+    'llama3.1:8b': Backend(ollama_add_import, ollama_reload),
+    'llama3.1:70b': Backend(ollama_add_import, ollama_reload),
+    'snr': Backend(snr_add_import, no_reload),
+}
+
+
+def get_backend(model_name: str) -> Backend:
+    backend = BACKENDS.get(model_name)
+    if backend is None:
+        raise Exception(f"Cannot match model: {model_name}")
+    return backend
+
+
+def print_stats() -> None:
+    ollama = sys.modules.get('infer_ollama')
+    if ollama is not None:
+        ollama.print_latency_stats()
+
+
+def is_timeout(e: Exception) -> bool:
+    """True for the timeouts of every backend. A backend that was never imported cannot have raised."""
+    if isinstance(e, TimeoutError):
+        return True
+    openai = sys.modules.get('openai')
+    return openai is not None and isinstance(e, openai.APITimeoutError)
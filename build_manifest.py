@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+MANIFEST_NAME = '.build-manifest.jsonl'
+# Outputs that have no manifest entry (made before the manifest existed) are kept as they are;
+# set BUILD_ADOPT_EXISTING=0 to rebuild them instead
+ADOPT_EXISTING = os.getenv('BUILD_ADOPT_EXISTING', '1') == '1'
+# Bytes read at a time when digesting a file
+DIGEST_CHUNK = 1 << 20
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def digest_file(path: str) -> Optional[str]:
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(DIGEST_CHUNK), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def digest_recipe(recipe: Dict[str, Any]) -> str:
+    return digest_bytes(json.dumps(recipe, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+
+def write_atomic(path: str, content: str) -> None:
+    """Write CONTENT to PATH through a temporary file and a rename, so PATH is never left half written."""
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class BuildManifest:
+    """Records how every output of a folder was produced.
+
+    An entry holds the digest of the inputs, of the recipe (the transformation
+    or model identity, its options and the prompt template) and of the output
+    itself. An output is up to date only if all three still match, so a changed
+    input, a changed prompt or a truncated output triggers a recomputation.
+
+    Entries are appended to OUTPUT_FOLDER/.build-manifest.jsonl; the last entry
+    of an output wins. An output without an entry predates the manifest: with
+    ADOPT_EXISTING it is recorded under the current recipe and kept, otherwise it
+    is rebuilt, since nothing tells how it was produced.
+    """
+
+    def __init__(self, output_folder: str, recipe: Dict[str, Any], adopt_existing: bool = ADOPT_EXISTING):
+        self.output_folder = output_folder
+        self.adopt_existing = adopt_existing
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.recipe = digest_recipe(recipe)
+        self.entries: Dict[str, Dict[str, str]] = dict()
+        self.lock = threading.Lock()
+        os.makedirs(output_folder, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash
+                        continue
+                    self.entries[entry['output']] = entry
+
+    @staticmethod
+    def digest_inputs(input_paths: Iterable[str]) -> str:
+        return digest_bytes('\n'.join(str(digest_file(p)) for p in input_paths).encode('utf-8'))
+
+    def is_up_to_date(self, output_name: str, input_paths: Iterable[str]) -> bool:
+        input_paths = list(input_paths)
+        output_path = os.path.join(self.output_folder, output_name)
+        output = digest_file(output_path)
+        if output is None:
+            return False
+        entry = self.entries.get(output_name)
+        if entry is None:
+            if not self.adopt_existing:
+                return False
+            self.record(output_name, input_paths)
+            return True
+        return (entry['inputs'] == self.digest_inputs(input_paths)
+                and entry['recipe'] == self.recipe
+                and entry['output_digest'] == output)
+
+    def record(self, output_name: str, input_paths: Iterable[str]) -> None:
+        """Record that OUTPUT_NAME, already written, was built from INPUT_PATHS."""
+        entry = {
+            'output': output_name,
+            'inputs': self.digest_inputs(input_paths),
+            'recipe': self.recipe,
+            'output_digest': digest_file(os.path.join(self.output_folder, output_name)),
+        }
+        with self.lock:
+            self.entries[output_name] = entry
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def write(self, output_name: str, content: str, input_paths: Iterable[str]) -> None:
+        write_atomic(os.path.join(self.output_folder, output_name), content)
+        self.record(output_name, input_paths)
+
+    def compact(self) -> None:
+        """Rewrite the manifest with only the last entry of every output."""
+        with self.lock:
+            write_atomic(self.path, ''.join(json.dumps(e) + '\n' for e in self.entries.values()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the build manifest of output folders.")
+    parser.add_argument('output_folders', nargs='+')
+    args = parser.parse_args()
+
+    for output_folder in args.output_folders:
+        manifest = BuildManifest(output_folder, dict())
+        manifest.compact()
+        print(f"{output_folder}: {len(manifest.entries)} entries")
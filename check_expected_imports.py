@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 import argparse
 from reduction import test_r, get_add_import_f
+import response_cache
 
 def main() -> bool:
     parser = argparse.ArgumentParser(description='Process a file with optional fully qualified names (FQNs).')
@@ -28,7 +30,13 @@ def main() -> bool:
 
     print(f"File Content:\n{file_content}")
 
-    return test_r(args.fqns, get_add_import_f(args.model_name, args.api_key, timeout=args.timeout)(file_content))
+    # Responses go through the shared response cache, so a candidate that was
+    # already checked by an earlier run does not reach the model again. A retry
+    # of r_property_check.py has its own attempt number and asks the model again.
+    attempt = int(os.environ.get('R_PROPERTY_ATTEMPT', '0'))
+    result = test_r(args.fqns, get_add_import_f(args.model_name, args.api_key, timeout=args.timeout, attempt=attempt)(file_content))
+    response_cache.print_stats()
+    return result
 
 if __name__ == '__main__':
     sys.exit(not main())
\ No newline at end of file
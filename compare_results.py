@@ -12,8 +12,10 @@ from scipy.stats import mannwhitneyu
 from scipy.stats import ks_2samp
 from scipy.stats import levene
 
-from java_import_util import remove_import_file, match_import, filter_ignored_imports
-from analyze_result_json import group_imports_by_lib
+from java_import_util import match_import, expand_star
+from corpus_index import remove_import_file
+from analyze_result_json import group_imports_by_lib, import_classifier, import_groups
+from import_metrics import ImportMatrix, scores
 
 def write_to_csv(data, filename):
     # Open the file in write mode
@@ -39,9 +41,6 @@ def get_import_statements(original_file, new_file):
     output_code, added_imports = remove_import_file(new_file)
     return imports, added_imports
 
-def expand_star(actual, expected):
-    return actual
-
 def filter_stattype(imports):
     grouped = group_imports_by_lib(imports)
     f = list()
@@ -49,6 +48,15 @@ def filter_stattype(imports):
         f.extend(g)
     return f
 
+def filter_imports(imports):
+    """Same as filter_stattype(filter_ignored_imports(imports)), classifying each import once"""
+    grouped = {group: [] for group in import_groups}
+    for imp in imports:
+        ignored, group = import_classifier.classify(imp)
+        if not ignored and group is not None:
+            grouped[group].append(imp)
+    return [imp for g in grouped.values() for imp in g]
+
 def calc_wilcoxon(output_arr: List[float], compare_arr: List[float]):
     if len(output_arr) == len(compare_arr):
         all_zero = True
@@ -86,8 +94,8 @@ def process_files(input_folder: str, output_folder: str, comparison_folder: str
         print(f"Actual: {actual}")
         actual = expand_star(actual, expected)
         print(f"Actual starred: {actual}")
-        expected = filter_stattype(filter_ignored_imports(list(set(expected))))
-        actual = filter_stattype(filter_ignored_imports(list(set(actual))))
+        expected = filter_imports(set(expected))
+        actual = filter_imports(set(actual))
         total = total + len(expected)
         match = match_import(actual, expected)
         correct = correct + len(match)
@@ -104,8 +112,8 @@ def process_files(input_folder: str, output_folder: str, comparison_folder: str
                 raise Exception(f"Output file not found: {compare_path}")
             expected, actual = get_import_statements(input_path, compare_path)
             actual = expand_star(actual, expected)
-            expected = filter_stattype(filter_ignored_imports(list(set(expected))))
-            actual = filter_stattype(filter_ignored_imports(list(set(actual))))
+            expected = filter_imports(set(expected))
+            actual = filter_imports(set(actual))
             match = match_import(actual, expected)
             compare_arr.append(len(match) / len(set(expected)))
             csv_rows[-1].extend([f'{len(match)}', f'{len(set(expected))}'])
@@ -129,7 +137,17 @@ def divide(top, bottom):
         return 0
     return top / bottom
 
-def process_files_precision_recall(input_folder: str, output_folder: str, comparison_folder: str = None, save_csv: bool = False, fqn_filter: List[str] = None):
+def print_file_imports(matrix: ImportMatrix, fqn_filter: List[str]):
+    filtered = set(fqn_filter)
+    for i, java_file in enumerate(matrix.files):
+        expected = matrix.row_imports(matrix.expected, i)
+        actual = [fqn for fqn in matrix.row_imports(matrix.actual, i) if fqn in expected or fqn not in filtered]
+        print(f"Processing {java_file}")
+        print(f"Expected: {expected}")
+        print(f"Actual: {actual}")
+        print(f"Correct: {matrix.row_imports(matrix.matched(), i)}")
+
+def process_files_precision_recall(input_folder: str, output_folder: str, comparison_folder: str = None, save_csv: bool = False, fqn_filter: List[str] = None, verbose: bool = False):
     if not os.path.exists(output_folder) or not os.listdir(output_folder):
         print("Output folder not found")
         return 0, 0, 0, None, None
@@ -137,90 +155,40 @@ def process_files_precision_recall(input_folder: str, output_folder: str, compar
         fqn_filter = list()
     # Precision = correct / recommended
     # Recall = correct / expected
-    correct_import = 0
-    recommended_import = 0
-    expected_import = 0
-    recall_output_arr = list()
-    recall_compare_arr = list()
-    precision_output_arr = list()
-    precision_compare_arr = list()
-    f1_output_arr = list()
-    f1_compare_arr = list()
-    csv_rows = list()
-
-    java_files = get_java_files(input_folder)
-    for java_file in java_files:
-        input_path = os.path.join(input_folder, java_file)
-        output_path = os.path.join(output_folder, java_file)
-        if not os.path.exists(output_path):
-            print("Output file not found: " + output_path)
-            continue
+    output = ImportMatrix(input_folder, output_folder, filter_imports)
+    if verbose:
+        print_file_imports(output, fqn_filter)
+    counts = output.counts(fqn_filter)
+    correct_import = int(counts['correct'].sum())
+    recommended_import = int(counts['recommended'].sum())
+    expected_import = int(counts['expected'].sum())
+
+    # Files without expected imports count in the totals only
+    with_expected = counts['expected'] > 0
+    files = [f for f, keep in zip(output.files, with_expected) if keep]
+    output_scores = {name: values[with_expected] for name, values in scores(counts).items()}
+    csv_rows = [[f, str(c), str(r), str(e)] for f, c, r, e in
+                zip(files, *(counts[name][with_expected] for name in ['correct', 'recommended', 'expected']))]
 
-        expected, actual = get_import_statements(input_path, output_path)
-        print(f"Processing {java_file}")
-        expected = set(filter_stattype(filter_ignored_imports(list(set(expected)))))
-        actual = set(filter_stattype(filter_ignored_imports(list(set(actual)))))
-        actual = expand_star(actual, expected)
-        for fqn in fqn_filter:
-            if fqn not in expected:
-                if fqn in actual:
-                    actual.remove(fqn)
-        match = set(match_import(actual, expected))
-        print(f"Expected: {sorted(expected)}")
-        print(f"Actual: {sorted(actual)}")
-        print(f"Correct: {sorted(match)}")
-        expected_import = expected_import + len(expected)
-        correct_import = correct_import + len(match)
-        recommended_import = recommended_import + len(actual)
-        if len(set(expected)) == 0:
-            continue
-        recall_output_arr.append(divide(len(match), len(set(expected))))
-        precision_output_arr.append(divide(len(match), len(set(actual))))
-        recall = divide(len(match), len(set(expected)))
-        precision = divide(len(match), len(set(actual)))
-        f1_output_arr.append(divide(2 * precision * recall, precision + recall))
-        csv_rows.append([f'{java_file}', f'{len(match)}', f'{len(actual)}', f'{len(set(expected))}'])
-
-        if comparison_folder is not None:
-            compare_path = os.path.join(comparison_folder, java_file)
-            if not os.path.exists(compare_path):
-                print("Output file not found: " + compare_path)
-                raise Exception(f"Output file not found: {compare_path}")
-            expected, actual = get_import_statements(input_path, compare_path)
-            actual = expand_star(actual, expected)
-            expected = set(filter_stattype(filter_ignored_imports(list(set(expected)))))
-            actual = set(filter_stattype(filter_ignored_imports(list(set(actual)))))
-            for fqn in fqn_filter:
-                if fqn not in expected:
-                    if fqn in actual:
-                        actual.remove(fqn)
-            match = set(match_import(actual, expected))
-            recall_compare_arr.append(divide(len(match), len(set(expected))))
-            precision_compare_arr.append(divide(len(match), len(set(actual))))
-            recall = divide(len(match), len(set(expected)))
-            precision = divide(len(match), len(set(actual)))
-            f1_compare_arr.append(divide(2 * precision * recall, precision + recall))
-            csv_rows[-1].extend([f'{len(match)}', f'{len(actual)}', f'{len(set(expected))}'])
+    if comparison_folder is not None:
+        compare = ImportMatrix(input_folder, comparison_folder, filter_imports, files=files)
+        compare_counts = compare.counts(fqn_filter)
+        compare_scores = scores(compare_counts)
+        for row, c, r, e in zip(csv_rows, *(compare_counts[name] for name in ['correct', 'recommended', 'expected'])):
+            row.extend([str(c), str(r), str(e)])
 
     if save_csv:
         write_to_csv(csv_rows, f'{os.path.basename(os.path.normpath(output_folder))}.csv')
     if comparison_folder is not None:
-        precision_wilcoxon_result = calc_wilcoxon(precision_output_arr, precision_compare_arr)
-        print(f"wilcoxon single-rank test {precision_wilcoxon_result}")
-        print(f"p<0.001? {precision_wilcoxon_result < 0.001}")
-        print(f"p<0.01? {precision_wilcoxon_result < 0.01}")
-        print(f"p<0.05? {precision_wilcoxon_result < 0.05}")
-        recall_wilcoxon_result = calc_wilcoxon(recall_output_arr, recall_compare_arr)
-        print(f"wilcoxon single-rank test {recall_wilcoxon_result}")
-        print(f"p<0.001? {recall_wilcoxon_result < 0.001}")
-        print(f"p<0.01? {recall_wilcoxon_result < 0.01}")
-        print(f"p<0.05? {recall_wilcoxon_result < 0.05}")
-        f1_wilcoxon_result = calc_wilcoxon(f1_output_arr, f1_compare_arr)
-        print(f"wilcoxon single-rank test {f1_wilcoxon_result}")
-        print(f"p<0.001? {f1_wilcoxon_result < 0.001}")
-        print(f"p<0.01? {f1_wilcoxon_result < 0.01}")
-        print(f"p<0.05? {f1_wilcoxon_result < 0.05}")
-        return correct_import, recommended_import, expected_import, precision_wilcoxon_result, recall_wilcoxon_result, f1_wilcoxon_result
+        results = list()
+        for name in ['precision', 'recall', 'f1']:
+            wilcoxon_result = calc_wilcoxon(output_scores[name].tolist(), compare_scores[name].tolist())
+            print(f"wilcoxon single-rank test {wilcoxon_result}")
+            print(f"p<0.001? {wilcoxon_result < 0.001}")
+            print(f"p<0.01? {wilcoxon_result < 0.01}")
+            print(f"p<0.05? {wilcoxon_result < 0.05}")
+            results.append(wilcoxon_result)
+        return correct_import, recommended_import, expected_import, *results
     return correct_import, recommended_import, expected_import, None, None, None
 
 if __name__ == "__main__":
@@ -232,4 +200,4 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
-    print(process_files_precision_recall(args.input_folder, args.output_folder, comparison_folder=args.comparison_folder, save_csv=args.save_csv))
+    print(process_files_precision_recall(args.input_folder, args.output_folder, comparison_folder=args.comparison_folder, save_csv=args.save_csv, verbose=True))
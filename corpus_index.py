@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from build_manifest import digest_file
+import java_import_util
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# Set CORPUS_INDEX_PATH to an empty string to parse the files on every call
+INDEX_PATH = os.getenv('CORPUS_INDEX_PATH', os.path.join(__location__, 'corpus-index.sqlite'))
+# Bumped when the layout or the meaning of the stored entries changes
+SCHEMA_VERSION = '2'
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def parser_version() -> str:
+    """Digest of the code that parses the files"""
+    return digest_file(os.path.realpath(java_import_util.__file__))
+
+
+def tokenizer_key(tokenizer) -> str:
+    """The name and version the token streams of TOKENIZER are stored under"""
+    version = tokenizer.index_version
+    return tokenizer.index_name if version is None else f'{tokenizer.index_name}@{version}'
+
+
+def pack_tokens(tokens: List[Any]) -> Tuple[str, bytes]:
+    """LLM token ids as an array of 32 bit integers, Java8 (type, text) tokens as JSON"""
+    if all(isinstance(token, int) for token in tokens):
+        return 'ids', array('I', tokens).tobytes()
+    return 'json', json.dumps(tokens, ensure_ascii=False).encode('utf-8')
+
+
+def unpack_tokens(kind: str, data: bytes) -> List[Any]:
+    if kind == 'ids':
+        ids = array('I')
+        ids.frombytes(data)
+        return ids.tolist()
+    return [tuple(token) for token in json.loads(data)]
+
+
+class CorpusIndex:
+    """The parsed snippets and their token streams in a SQLite file.
+
+    A file is parsed with remove_import_file once; the entry is reused while
+    the file's mtime and size are unchanged, or its content digest is the
+    same. Token streams are keyed on the tokenizer, its version and the
+    digest of the encoded text, so they serve every file, and every reduced
+    variant, that has the same code. The parsed files are dropped once the
+    parser's code changed. Several processes can share one file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parsed = 0
+        self.reused = 0
+        self.local = threading.local()
+        # (path, mtime_ns, size) -> (code, imports), for repeated lookups in one run
+        self.memory: Dict[Tuple[str, int, int], Tuple[str, List[str]]] = dict()
+        with self.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                         'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, digest TEXT, '
+                         'code TEXT, imports TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS tokens ('
+                         'tokenizer TEXT, digest TEXT, kind TEXT, data BLOB, '
+                         'PRIMARY KEY (tokenizer, digest))')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+            stored = dict(conn.execute('SELECT name, value FROM meta'))
+            versions = {'schema': SCHEMA_VERSION, 'parser': parser_version()}
+            if stored.get('schema') != SCHEMA_VERSION:
+                # Token streams used to be stored without the tokenizer's version
+                conn.execute('DELETE FROM tokens')
+                conn.execute('DELETE FROM files')
+            elif stored.get('parser') != versions['parser']:
+                conn.execute('DELETE FROM files')
+            if stored != versions:
+                conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', versions.items())
+
+    def connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads, nor with forked workers
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def remove_import_file(self, file: str) -> Tuple[str, List[str]]:
+        """Same as java_import_util.remove_import_file"""
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return java_import_util.remove_import_file(file)
+        path = os.path.realpath(file)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key in self.memory:
+            code, imports = self.memory[key]
+            return code, list(imports)
+
+        with self.connection() as conn:
+            row = conn.execute('SELECT mtime_ns, size, digest, code, imports FROM files WHERE path = ?',
+                               (path,)).fetchone()
+        digest = None
+        if row is not None and (row[0], row[1]) != key[1:]:
+            # Touched, but maybe not changed
+            digest = digest_file(path)
+            if digest == row[2]:
+                with self.connection() as conn:
+                    conn.execute('UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?', (*key[1:], path))
+            else:
+                row = None
+        if row is not None:
+            self.reused += 1
+            result = row[3], json.loads(row[4])
+        else:
+            self.parsed += 1
+            result = java_import_util.remove_import_file(file)
+            with self.connection() as conn:
+                conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                             (*key, digest or digest_file(path), result[0], json.dumps(result[1])))
+        self.memory[key] = result
+        return result[0], list(result[1])
+
+    def encode(self, tokenizer, text: str) -> List[Any]:
+        return self.encode_batch(tokenizer, [text])[0]
+
+    def encode_batch(self, tokenizer, texts: List[str]) -> List[List[Any]]:
+        """TOKENIZER.encode of each text, encoding only the texts that are not stored yet"""
+        if tokenizer.index_name is None:
+            # Not from get_decoder, nothing to key the stored tokens on
+            return tokenizer.encode_batch(texts)
+        key = tokenizer_key(tokenizer)
+        digests = [text_digest(text) for text in texts]
+        found: Dict[str, List[Any]] = dict()
+        with self.connection() as conn:
+            for digest in set(digests):
+                row = conn.execute('SELECT kind, data FROM tokens WHERE tokenizer = ? AND digest = ?',
+                                   (key, digest)).fetchone()
+                if row is not None:
+                    found[digest] = unpack_tokens(*row)
+        missing = {digest: text for digest, text in zip(digests, texts) if digest not in found}
+        if missing:
+            encoded = tokenizer.encode_batch(list(missing.values()))
+            with self.connection() as conn:
+                for digest, tokens in zip(missing, encoded):
+                    found[digest] = tokens
+                    conn.execute('INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)',
+                                 (key, digest, *pack_tokens(tokens)))
+        # Callers may change the lists, and a text can repeat
+        return [list(found[digest]) for digest in digests]
+
+    def index_folder(self, folder: str, tokenizers=()) -> int:
+        """Parse every Java file in FOLDER, and encode its code with TOKENIZERS"""
+        files = [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith('.java')]
+        codes = [self.remove_import_file(file)[0] for file in files]
+        for tokenizer in tokenizers:
+            self.encode_batch(tokenizer, codes)
+        return len(files)
+
+    def stats(self) -> Dict[str, int]:
+        with self.connection() as conn:
+            files = conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+            token_streams = conn.execute('SELECT COUNT(*) FROM tokens').fetchone()[0]
+        return {'files': files, 'token_streams': token_streams, 'parsed': self.parsed, 'reused': self.reused}
+
+
+_index: Optional[CorpusIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> Optional[CorpusIndex]:
+    global _index
+    if not INDEX_PATH:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = CorpusIndex(INDEX_PATH)
+    return _index
+
+
+def remove_import_file(file: str) -> Tuple[str, List[str]]:
+    index = get_index()
+    if index is None:
+        return java_import_util.remove_import_file(file)
+    return index.remove_import_file(file)
+
+
+def encode(tokenizer, text: str) -> List[Any]:
+    index = get_index()
+    if index is None:
+        return tokenizer.encode(text)
+    return index.encode(tokenizer, text)
+
+
+def encode_batch(tokenizer, texts: List[str]) -> List[List[Any]]:
+    index = get_index()
+    if index is None:
+        return tokenizer.encode_batch(texts)
+    return index.encode_batch(tokenizer, texts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse snippet folders into the corpus index.")
+    parser.add_argument('folders', nargs='*', help='Folders of Java files to index')
+    parser.add_argument('--tokenizer', action='append', default=[],
+                        help='Also store the token stream of each file for this model (java8, gpt-4o, ...)')
+    parser.add_argument('--clear', action='store_true', help='Delete all entries first')
+    args = parser.parse_args()
+
+    index = get_index()
+    if index is None:
+        parser.error("CORPUS_INDEX_PATH is empty")
+    if args.clear:
+        with index.connection() as conn:
+            conn.execute('DELETE FROM files')
+            conn.execute('DELETE FROM tokens')
+    from tokenize_llm import get_decoder
+    tokenizers = [get_decoder(name) for name in args.tokenizer]
+    for folder in args.folders:
+        print(f"{folder}: {index.index_folder(folder, tokenizers)} files")
+    print(f"Corpus index: {index.stats()}")
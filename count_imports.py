@@ -3,8 +3,8 @@
 import json
 import os
 import numpy as np
-from java_import_util import remove_import_file, filter_ignored_imports
-from compare_results import filter_stattype
+from corpus_index import remove_import_file
+from compare_results import filter_imports
 
 def get_java_files(input_folder):
     """Retrieve all Java files from the input folder."""
@@ -18,9 +18,7 @@ def count_imports_in_file(file_path):
     """Count the number of import statements in a given Java file."""
     try:
         _, imports = remove_import_file(file_path)
-        filtered_imports = filter_ignored_imports(imports)
-        stattype_filtered_imports = filter_stattype(filtered_imports)
-        return len(stattype_filtered_imports)
+        return len(filter_imports(imports))
     except Exception as e:
         print(f"Error processing file {file_path}: {e}")
         return 0
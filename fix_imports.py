@@ -5,6 +5,8 @@ import sys
 import os
 import re
 
+from build_manifest import BuildManifest, digest_file
+
 def get_java_files(input_folder):
     return [f for f in os.listdir(input_folder) if f.endswith('.java')]
 
@@ -16,22 +18,28 @@ def write_file(filepath, content):
     with open(filepath, 'w') as file:
         file.write(content)
 
-def fix_imports(input_path, output_path):
+CLASSPATH = 'snq-server-0.0.1-SNAPSHOT-jar-with-dependencies.jar:lib/*'
+
+def fix_imports(input_path, output_path) -> bool:
+    """Run ExtractImport on INPUT_PATH, writing OUTPUT_PATH. Returns whether it succeeded."""
     try:
         result = subprocess.run(
-            ['java', '-cp', 'snq-server-0.0.1-SNAPSHOT-jar-with-dependencies.jar:lib/*', 'org.javelus.snr.toy.ExtractImport', input_path, output_path],
+            ['java', '-cp', CLASSPATH, 'org.javelus.snr.toy.ExtractImport', input_path, output_path],
             check=True,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
         )
         print(result.stdout.decode())
         print("Execution completed successfully.")
+        return True
     except subprocess.CalledProcessError as e:
         print(f"Error during execution: {e.stderr.decode()}")
+        return False
 
 def process_files(input_folder, output_folder):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
+    manifest = BuildManifest(output_folder, {'transform': 'ExtractImport', 'jar': digest_file(CLASSPATH.split(':')[0])})
 
     i = 0
     for root, dirs, files in os.walk(input_folder):
@@ -39,12 +47,19 @@ def process_files(input_folder, output_folder):
             if file.endswith(".java"):
                 input_path = os.path.join(root, file)
                 print(f"Processing: {input_path}")
-                output_path = os.path.join(output_folder, file[:-5]+str(i)+".java")
-                if os.path.exists(output_path):
+                output_name = file[:-5]+str(i)+".java"
+                if manifest.is_up_to_date(output_name, [input_path]):
                     continue
 
                 i = i + 1
-                fix_imports(input_path, output_path)
+                # ExtractImport writes the output itself; rename it into place once complete
+                tmp_path = os.path.join(output_folder, f".{output_name}.{os.getpid()}.tmp")
+                if fix_imports(input_path, tmp_path) and os.path.exists(tmp_path):
+                    os.replace(tmp_path, os.path.join(output_folder, output_name))
+                    manifest.record(output_name, [input_path])
+                elif os.path.exists(tmp_path):
+                    # Partly written before ExtractImport failed
+                    os.unlink(tmp_path)
 
 
 if __name__ == "__main__":
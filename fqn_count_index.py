@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from build_manifest import digest_file
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# Set FQN_COUNT_INDEX_PATH to an empty string to parse the Boa output on every run
+INDEX_PATH = os.getenv('FQN_COUNT_INDEX_PATH', os.path.join(__location__, 'fqn-count-index.sqlite'))
+
+# One line of the all_fqns_count.boa output: `fqn_count[<fqn>] = <number>`
+FQN_COUNT_PATTERN = re.compile(r'^fqn_count\[([^\]\n]*)\] = (-?\d+)[ \t\r]*$', re.MULTILINE)
+
+# Host parameters per statement, below SQLite's lowest default limit
+LOOKUP_CHUNK = 900
+
+
+def parse_fqn_counts(file_path: str) -> Iterator[Tuple[str, int]]:
+    """The (fqn, count) pairs of a Boa fqn_count output file"""
+    with open(file_path, 'r') as file:
+        text = file.read()
+    parsed = 0
+    for fqn, number in FQN_COUNT_PATTERN.findall(text):
+        parsed += 1
+        yield fqn, int(number)
+    lines = text.count('\nfqn_count[') + text.startswith('fqn_count[')
+    if lines != parsed:
+        print(f"Skipped {lines - parsed} malformed fqn_count lines in {file_path}")
+
+
+def prefix_end(prefix: str) -> str:
+    """The smallest string after every string that starts with PREFIX"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class FqnCountIndex:
+    """The counts of Boa fqn_count outputs in a SQLite file.
+
+    An output is parsed once and stored under its content digest; it is
+    parsed again only after its mtime or size changed and its digest differs.
+    FQNs are the primary key within an output, so point lookups and prefix
+    queries (every FQN under `org.hibernate.`) read only the matching rows.
+    With an empty path the index is an in-memory database of one run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        # sqlite3 cannot share an in-memory database between connections
+        self.memory_conn = sqlite3.connect(':memory:', check_same_thread=False) if not path else None
+        with self.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS sources ('
+                         'path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, digest TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS outputs (id INTEGER PRIMARY KEY, digest TEXT UNIQUE)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counts ('
+                         'output INTEGER, fqn TEXT, count INTEGER, PRIMARY KEY (output, fqn)) WITHOUT ROWID')
+
+    def connection(self) -> sqlite3.Connection:
+        if self.memory_conn is not None:
+            return self.memory_conn
+        # sqlite3 connections cannot be shared between threads, nor with forked workers
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def load(self, file_path: str) -> 'FqnCounts':
+        """The counts of FILE_PATH, parsed and stored if they are not stored yet"""
+        stat = os.stat(file_path)
+        path = os.path.realpath(file_path)
+        with self.connection() as conn:
+            row = conn.execute('SELECT sources.mtime_ns, sources.size, outputs.id FROM sources '
+                               'JOIN outputs ON outputs.digest = sources.digest WHERE path = ?', (path,)).fetchone()
+            if row is not None and (row[0], row[1]) == (stat.st_mtime_ns, stat.st_size):
+                return FqnCounts(self, row[2])
+
+            digest = digest_file(path)
+            row = conn.execute('SELECT id FROM outputs WHERE digest = ?', (digest,)).fetchone()
+            # Parsed before taking the write lock, so other processes only wait for the inserts
+            counts = dict(parse_fqn_counts(path)) if row is None else None
+
+            # Several processes may build the index at once: look again under the write lock
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT id FROM outputs WHERE digest = ?', (digest,)).fetchone()
+            if row is None:
+                if counts is None:
+                    counts = dict(parse_fqn_counts(path))
+                output = conn.execute('INSERT INTO outputs (digest) VALUES (?)', (digest,)).lastrowid
+                # The last line of an FQN counts, and rows in key order fill the table's B-tree fastest
+                conn.executemany('INSERT INTO counts VALUES (?, ?, ?)',
+                                 ((output, fqn, counts[fqn]) for fqn in sorted(counts)))
+            else:
+                output = row[0]
+            conn.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+                         (path, stat.st_mtime_ns, stat.st_size, digest))
+            # Drop outputs no source refers to anymore
+            conn.execute('DELETE FROM outputs WHERE digest NOT IN (SELECT digest FROM sources)')
+            conn.execute('DELETE FROM counts WHERE output NOT IN (SELECT id FROM outputs)')
+        return FqnCounts(self, output)
+
+
+class FqnCounts:
+    """The counts of one Boa output in a FqnCountIndex"""
+
+    def __init__(self, index: FqnCountIndex, output: int):
+        self.index = index
+        self.output = output
+
+    def get(self, fqn: str, default: Optional[int] = None) -> Optional[int]:
+        with self.index.connection() as conn:
+            row = conn.execute('SELECT count FROM counts WHERE output = ? AND fqn = ?', (self.output, fqn)).fetchone()
+        return default if row is None else row[0]
+
+    def lookup(self, fqns: Iterable[str]) -> Dict[str, int]:
+        """The counts of the FQNs that are in the output"""
+        fqns = list(fqns)
+        found = dict()
+        with self.index.connection() as conn:
+            for i in range(0, len(fqns), LOOKUP_CHUNK):
+                chunk = fqns[i:i + LOOKUP_CHUNK]
+                found.update(conn.execute(f'SELECT fqn, count FROM counts WHERE output = ? '
+                                          f'AND fqn IN ({",".join("?" * len(chunk))})', (self.output, *chunk)))
+        return found
+
+    def prefix(self, prefix: str) -> Dict[str, int]:
+        """The counts of the FQNs that start with PREFIX, in FQN order"""
+        if not prefix:
+            return self.to_dict()
+        with self.index.connection() as conn:
+            return dict(conn.execute('SELECT fqn, count FROM counts WHERE output = ? AND fqn >= ? AND fqn < ? ORDER BY fqn',
+                                     (self.output, prefix, prefix_end(prefix))))
+
+    def to_dict(self) -> Dict[str, int]:
+        with self.index.connection() as conn:
+            return dict(conn.execute('SELECT fqn, count FROM counts WHERE output = ? ORDER BY fqn', (self.output,)))
+
+    def __len__(self) -> int:
+        with self.index.connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM counts WHERE output = ?', (self.output,)).fetchone()[0]
+
+
+_index: Optional[FqnCountIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> FqnCountIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FqnCountIndex(INDEX_PATH)
+    return _index
+
+
+def load_fqn_counts(file_path: str) -> FqnCounts:
+    return get_index().load(file_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store a Boa fqn_count output in the FQN count index and query it.")
+    parser.add_argument('file', help='Output of all_fqns_count.boa')
+    parser.add_argument('--fqn', action='append', default=[], help='Print the count of this FQN')
+    parser.add_argument('--prefix', action='append', default=[], help='Print the counts of the FQNs under this prefix')
+    args = parser.parse_args()
+
+    counts = load_fqn_counts(args.file)
+    print(f"{args.file}: {len(counts)} FQNs")
+    found = counts.lookup(args.fqn)
+    for fqn in args.fqn:
+        print(f"{fqn} = {found.get(fqn)}")
+    for prefix in args.prefix:
+        matches = counts.prefix(prefix)
+        print(f"{prefix}: {len(matches)} FQNs, {sum(matches.values())} imports")
+        for fqn, count in matches.items():
+            print(f"  {fqn} = {count}")
@@ -0,0 +1,127 @@
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from corpus_index import remove_import_file
+
+
+class ImportMatrix:
+    """The expected and the inferred imports of the snippets in INPUT_FOLDER.
+
+    Every import is given an integer id. Row i of `expected` and of `actual` marks
+    the imports of files[i] in INPUT_FOLDER and in OUTPUT_FOLDER, after
+    FILTER_F (compare_results.filter_imports). Files without an output are left
+    out, unless FILES names the files to read, in which case a missing output is
+    an error.
+    """
+
+    def __init__(self, input_folder: str, output_folder: str, filter_f: Callable[[Iterable[str]], List[str]],
+                 files: Optional[List[str]] = None):
+        self.ids: Dict[str, int] = dict()
+        self.files: List[str] = list()
+        expected_rows = list()
+        actual_rows = list()
+        if files is None:
+            files = sorted(f for f in os.listdir(input_folder) if f.endswith('.java'))
+            required = False
+        else:
+            required = True
+        for java_file in files:
+            output_path = os.path.join(output_folder, java_file)
+            if not os.path.exists(output_path):
+                if required:
+                    raise Exception(f"Output file not found: {output_path}")
+                print("Output file not found: " + output_path)
+                continue
+            _, expected = remove_import_file(os.path.join(input_folder, java_file))
+            _, actual = remove_import_file(output_path)
+            self.files.append(java_file)
+            expected_rows.append(self.to_ids(filter_f(set(expected))))
+            actual_rows.append(self.to_ids(filter_f(set(actual))))
+        self.expected = self.to_matrix(expected_rows)
+        self.actual = self.to_matrix(actual_rows)
+
+    def to_ids(self, fqns: Iterable[str]) -> List[int]:
+        return [self.ids.setdefault(fqn, len(self.ids)) for fqn in fqns]
+
+    def to_matrix(self, rows: List[List[int]]) -> sparse.csr_matrix:
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(row) for row in rows])
+        indices = np.fromiter((i for row in rows for i in row), dtype=np.int64, count=int(indptr[-1]))
+        data = np.ones(len(indices), dtype=np.int64)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(self.ids)))
+
+    def row_imports(self, matrix: sparse.csr_matrix, i: int) -> List[str]:
+        names = list(self.ids)
+        return sorted(names[j] for j in matrix.indices[matrix.indptr[i]:matrix.indptr[i + 1]])
+
+    def groups(self, fqn_groups: Sequence[Iterable[str]]) -> sparse.csr_matrix:
+        """Import id x group matrix, marking the ids of the FQNs in each group"""
+        rows = list()
+        columns = list()
+        for column, fqns in enumerate(fqn_groups):
+            for fqn in fqns:
+                i = self.ids.get(fqn)
+                if i is not None:
+                    rows.append(i)
+                    columns.append(column)
+        data = np.ones(len(rows), dtype=np.int64)
+        # An FQN listed twice in a group is still one import: duplicates would be summed
+        return sparse.csr_matrix((data, (rows, columns)), shape=(len(self.ids), len(fqn_groups))).sign()
+
+    def matched(self) -> sparse.csr_matrix:
+        return self.expected.multiply(self.actual).tocsr()
+
+    def counts(self, fqn_filter: Iterable[str] = ()) -> Dict[str, np.ndarray]:
+        """Per file: correct, recommended and expected imports. Recommended imports in
+        FQN_FILTER that were not expected are not counted, as in compare_results."""
+        matched = self.matched()
+        correct = np.asarray(matched.sum(axis=1)).ravel()
+        recommended = np.asarray(self.actual.sum(axis=1)).ravel()
+        expected = np.asarray(self.expected.sum(axis=1)).ravel()
+        filtered = self.groups([fqn_filter])
+        if filtered.nnz:
+            wrong = self.actual - matched
+            recommended = recommended - np.asarray((wrong @ filtered).todense()).ravel()
+        return {'correct': correct, 'recommended': recommended, 'expected': expected}
+
+    def counts_by_group(self, fqn_groups: Sequence[Iterable[str]]) -> Dict[str, np.ndarray]:
+        """Totals over all files with the expected imports limited to each group:
+        correct and expected per group, and the recommended imports, which do not depend on it."""
+        groups = self.groups(fqn_groups)
+        correct = np.asarray((self.matched() @ groups).sum(axis=0)).ravel()
+        expected = np.asarray((self.expected @ groups).sum(axis=0)).ravel()
+        return {'correct': correct, 'expected': expected, 'recommended': int(self.actual.sum())}
+
+
+def bin_groups(values: Iterable[Tuple[str, float]], edges: Sequence[float]) -> List[List[str]]:
+    """Split the names of (name, value) pairs into one group per edge: edges[i] <= value < edges[i+1],
+    and value >= edges[-1] for the last one. Names below edges[0] are in no group."""
+    edges = np.asarray(edges)
+    if np.any(np.diff(edges) <= 0):
+        raise Exception(f"Bin edges must increase: {edges.tolist()}")
+    values = list(values)
+    index = np.searchsorted(edges, np.asarray([value for _, value in values]), side='right') - 1
+    groups: List[List[str]] = [list() for _ in range(len(edges))]
+    for (name, _), i in zip(values, index.tolist()):
+        if i >= 0:
+            groups[i].append(name)
+    return groups
+
+
+def ratios(top: np.ndarray, bottom: np.ndarray) -> np.ndarray:
+    """compare_results.divide for arrays: 0/0 is 1, x/0 is 0"""
+    top = top.astype(float)
+    bottom = bottom.astype(float)
+    result = np.divide(top, bottom, out=np.zeros_like(top), where=bottom != 0)
+    result[(bottom == 0) & (top == 0)] = 1
+    return result
+
+
+def scores(counts: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Per file precision, recall and F1, as compare_results computes them"""
+    precision = ratios(counts['correct'], counts['recommended'])
+    recall = ratios(counts['correct'], counts['expected'])
+    return {'precision': precision, 'recall': recall, 'f1': ratios(2 * precision * recall, precision + recall)}
@@ -2,14 +2,41 @@
 
 import sys
 import argparse
+import atexit
 import os
-import urllib.request
+import statistics
+import threading
+import time
 import json
 
+import requests
+import urllib3
+
 from prompt import prompt
+from response_cache import cached
+from build_manifest import BuildManifest
+from inference_driver import INFER_CONCURRENCY, parse_retry_after, run_concurrently, with_backoff
 from java_import_util import remove_import_file
 
 host = os.getenv('OLLAMA_HOST', 'http://localhost:11434').rstrip('/')
+# Stream responses token by token; lets a timeout abort a long generation early
+OLLAMA_STREAM = os.getenv('OLLAMA_STREAM', '0') == '1'
+# Maximum number of kept-alive connections to the server
+OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', '16'))
+# When the model is unloaded:
+#   request - after every request, so every request starts from a freshly loaded model
+#   file    - kept loaded while one file is processed, reloaded before the next one
+#   run     - kept loaded until the process exits
+# Only request resets the model's context state between requests, so it is the default
+OLLAMA_RESIDENCY = os.getenv('OLLAMA_RESIDENCY', 'request')
+# How long ollama keeps an idle model loaded under the file and run policies
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+OPTIONS = {
+    "seed": 1,
+    "temperature": 0,
+    "num_ctx": 4096,
+    "num_keep": 0,
+}
 
 def get_java_files(input_folder):
     return [f for f in os.listdir(input_folder) if f.endswith('.java')]
@@ -22,87 +49,219 @@ def write_file(filepath, content):
     with open(filepath, 'w') as file:
         file.write(content)
 
-def send_payload(payload, timeout=None):
-    # Convert the payload to a JSON string
-    data = json.dumps(payload).encode("utf-8")
+class OllamaClient:
+    """Talks to the ollama chat API over a pool of kept-alive connections.
+
+    Every request's latency is recorded, together with the load, prompt
+    evaluation and generation durations reported by the server. A request
+    that takes longer than its timeout raises TimeoutError.
+    """
+
+    def __init__(self, base_url=host, pool_size=OLLAMA_POOL_SIZE, stream=OLLAMA_STREAM):
+        self.base_url = base_url
+        self.stream = stream
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.metrics = list()
+        self.residency_events = list()
+        self.lock = threading.Lock()
+
+    def chat(self, payload, timeout=None):
+        payload = dict(payload, stream=self.stream)
+        start = time.monotonic()
+        try:
+            with self.session.post(f"{self.base_url}/api/chat", json=payload, timeout=timeout, stream=self.stream) as response:
+                response.raise_for_status()
+                if self.stream:
+                    try:
+                        content, first_token, final = self.read_stream(response, start, timeout)
+                    except requests.ConnectionError as e:
+                        # iter_lines reports a read timeout as a ConnectionError wrapping urllib3's ReadTimeoutError
+                        if e.args and isinstance(e.args[0], urllib3.exceptions.ReadTimeoutError):
+                            raise TimeoutError(f"ollama did not finish within {timeout}s") from e
+                        raise
+                else:
+                    final = response.json()
+                    content, first_token = final.get('message', dict()).get('content', ''), None
+        except requests.Timeout as e:
+            raise TimeoutError(f"ollama did not answer within {timeout}s") from e
+        self.record(time.monotonic() - start, first_token, final)
+        return content.strip()
+
+    def set_residency(self, model, keep_alive):
+        """Load MODEL and keep it for KEEP_ALIVE, or unload it if KEEP_ALIVE is "0".
+        Returns the wall-clock seconds it took."""
+        payload = {"model": model, "options": OPTIONS, "stream": False, "keep_alive": keep_alive, "messages": []}
+        start = time.monotonic()
+        with self.session.post(f"{self.base_url}/api/chat", json=payload) as response:
+            response.raise_for_status()
+            final = response.json()
+        elapsed = time.monotonic() - start
+        event = 'unload' if keep_alive == "0" else 'load'
+        with self.lock:
+            self.residency_events.append({'event': event, 'model': model, 'seconds': elapsed,
+                                          'load_duration': final.get('load_duration', 0) / 1e9})
+        return elapsed
 
-    # Create the request object with the appropriate headers
-    req = urllib.request.Request(f"{host}/api/chat", data=data, headers={'Content-Type': 'application/json'})
+    def residency_stats(self):
+        with self.lock:
+            events = list(self.residency_events)
+        stats = dict()
+        for event in ['load', 'unload']:
+            seconds = [e['seconds'] for e in events if e['event'] == event]
+            if seconds:
+                stats[event + 's'] = len(seconds)
+                stats[event + '_time'] = sum(seconds)
+        return stats
 
-    try:
-        # Send the request and read the response
-        with urllib.request.urlopen(req, timeout=timeout) as response:
-            result = response.read()
-            response_data = json.loads(result)
+    @staticmethod
+    def read_stream(response, start, timeout):
+        parts = list()
+        first_token = None
+        final = dict()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if first_token is None:
+                first_token = time.monotonic() - start
+            parts.append(chunk.get('message', dict()).get('content', ''))
+            if chunk.get('done'):
+                final = chunk
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(f"ollama did not finish within {timeout}s")
+        return ''.join(parts), first_token, final
 
-            # Extract the content from the response
-            return response_data['message']['content'].strip()
+    def record(self, latency, first_token, final):
+        # ollama reports durations in nanoseconds
+        metric = {'latency': latency, 'first_token': first_token}
+        for key in ['load_duration', 'prompt_eval_duration', 'eval_duration']:
+            metric[key] = final.get(key, 0) / 1e9
+        metric['eval_count'] = final.get('eval_count', 0)
+        with self.lock:
+            self.metrics.append(metric)
 
-    except urllib.error.URLError as e:
-        # Handle potential errors (e.g., network issues, API failures)
-        raise e
+    def latency_stats(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        if not metrics:
+            return dict()
+        latencies = sorted(m['latency'] for m in metrics)
+        return {
+            'requests': len(metrics),
+            'mean': statistics.fmean(latencies),
+            'p50': latencies[len(latencies) // 2],
+            'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'load': sum(m['load_duration'] for m in metrics),
+            'prompt_eval': sum(m['prompt_eval_duration'] for m in metrics),
+            'eval': sum(m['eval_duration'] for m in metrics),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> OllamaClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+    return _client
+
+def format_stats(stats):
+    return ', '.join(f"{k}={v:.3f}s" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items())
+
+def print_latency_stats():
+    stats = get_client().latency_stats()
+    if stats:
+        print("ollama latency: " + format_stats(stats))
+    stats = get_client().residency_stats()
+    if stats:
+        print("ollama residency: " + format_stats(stats))
+
+def send_payload(payload, timeout=None):
+    return get_client().chat(payload, timeout=timeout)
+
+def keep_alive():
+    return "0" if OLLAMA_RESIDENCY == 'request' else OLLAMA_KEEP_ALIVE
+
+_loaded_models = set()
+
+def unload_model(model):
+    get_client().set_residency(model, "0")
+    _loaded_models.discard(model)
 
 def reload_model(model):
-    payload = {
-        "model": model,
-        "options": {
-            "seed": 1,
-            "temperature": 0,
-            "num_ctx": 4096,
-            "max_tokens": 800,
-        },
-        "stream": False,
-        "keep_alive": "0",
-        "messages": []
-    }
+    """Prepare MODEL for the next file according to OLLAMA_RESIDENCY."""
+    if OLLAMA_RESIDENCY == 'run' and model in _loaded_models:
+        return
+    unload_model(model)
+    if OLLAMA_RESIDENCY == 'request':
+        return
+    get_client().set_residency(model, keep_alive())
+    _loaded_models.add(model)
 
-    send_payload(payload)
+@atexit.register
+def unload_models():
+    for model in list(_loaded_models):
+        unload_model(model)
 
-def add_import_statements(model, input_code, timeout=None):
+def add_import_statements(model, input_code, timeout=None, attempt=0):
     # Create the payload to send in the POST request
     payload = {
         "model": model,
-        "options": {
-            "seed": 1,
-            "temperature": 0,
-            "num_ctx": 4096,
-            "num_keep": 0,
-        },
+        "options": OPTIONS,
         "stream": False,
-        "keep_alive": "0",
+        "keep_alive": keep_alive(),
         "messages": prompt(input_code),
     }
-    return send_payload(payload, timeout=timeout)
+    # Responses under a kept-loaded model may differ, so each policy has its own entries
+    return cached(model, payload["messages"], dict(payload["options"], residency=OLLAMA_RESIDENCY),
+                  lambda: send_payload(payload, timeout=timeout), attempt=attempt)
+
 
+def retry_after(e):
+    if isinstance(e, requests.HTTPError):
+        return parse_retry_after(e.response.headers) if e.response.status_code in (429, 503) else None
+    if isinstance(e, (requests.ConnectionError, TimeoutError)):
+        return 0
+    return None
 
 def add_import_statements_file(model, java_file):
     input_code, imports = remove_import_file(java_file)
     print(f"prompting llama with {input_code} {imports}")
     return add_import_statements(model, input_code)
 
-def process_files(model, input_folder, output_folder="./"):
+def process_files(model, input_folder, output_folder="./", concurrency=INFER_CONCURRENCY):
     output_folder_name = os.path.join(output_folder, model.replace(":", "-") + "-output-" + os.path.basename(os.path.normpath(input_folder)))
     if not os.path.exists(output_folder_name):
         os.makedirs(output_folder_name)
+    manifest = BuildManifest(output_folder_name, {'model': model, 'options': OPTIONS, 'prompt': prompt('')})
 
-    java_files = get_java_files(input_folder)
-    for java_file in java_files:
+    def process_java_file(java_file):
         input_path = os.path.join(input_folder, java_file)
-        output_path = os.path.join(output_folder_name, java_file)
-        if os.path.exists(output_path):
-            continue
-
-        response = add_import_statements_file(model, input_path)
-        write_file(output_path, response)
+        response = with_backoff(lambda: add_import_statements_file(model, input_path), retry_after)
+        manifest.write(java_file, response, [input_path])
         print(f"{response}")
         print(f"Processed {java_file}")
 
+    java_files = [f for f in get_java_files(input_folder)
+                  if not manifest.is_up_to_date(f, [os.path.join(input_folder, f)])]
+    if java_files:
+        reload_model(model)
+    run_concurrently(java_files, process_java_file, concurrency)
+    print_latency_stats()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process snippets with a specified model.")
     parser.add_argument('model_name', type=str, help='The name of the model to be used')
     parser.add_argument('input_folder', type=str, help='The input folder containing data to be processed')
     parser.add_argument('output_folder', nargs='?', default='./', help='The output folder to save processed data (default: "./")')
+    parser.add_argument('--jobs', type=int, default=INFER_CONCURRENCY, help=f'Number of concurrent requests (default: {INFER_CONCURRENCY})')
     args = parser.parse_args()
 
-    print(process_files(args.model_name, args.input_folder, args.output_folder))
+    print(process_files(args.model_name, args.input_folder, args.output_folder, args.jobs))
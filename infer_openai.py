@@ -8,9 +8,15 @@ import openai
 import argparse
 
 from prompt import prompt
+from response_cache import cached
+from build_manifest import BuildManifest
+from inference_driver import INFER_CONCURRENCY, RateLimiter, estimate_tokens, parse_retry_after, run_concurrently, with_backoff
 from java_import_util import remove_import_file
 
 MAX_RETRIES = 0
+OPTIONS = {"seed": 1, "temperature": 0, "max_completion_tokens": 800}
+# Requests and tokens per minute allowed by the account; 0 means unlimited
+rate_limiter = RateLimiter(float(os.getenv('OPENAI_RPM', '0')), float(os.getenv('OPENAI_TPM', '0')))
 
 def get_java_files(input_folder):
     return [f for f in os.listdir(input_folder) if f.endswith('.java')]
@@ -24,7 +30,13 @@ def write_file(filepath, content):
         file.write(content)
 
 def add_import_statements(model, api_key, input_code, timeout=None, attempt=0):
+    return cached(model, prompt(input_code), OPTIONS,
+                  lambda: request_import_statements(model, api_key, input_code, timeout=timeout),
+                  attempt=attempt)
+
+def request_import_statements(model, api_key, input_code, timeout=None, attempt=0):
     openai.api_key = api_key
+    rate_limiter.acquire(estimate_tokens(input_code, OPTIONS["max_completion_tokens"]))
     try:
         if timeout is None:
             response = openai.chat.completions.create(
@@ -49,37 +61,45 @@ def add_import_statements(model, api_key, input_code, timeout=None, attempt=0):
             wait_time = random.uniform(1, 5) * (attempt + 1)
             print(f"Timeout occurred. Retrying in {wait_time:.2f} seconds...")
             time.sleep(wait_time)
-            return add_import_statements(model, api_key, input_code, timeout, attempt + 1)
+            return request_import_statements(model, api_key, input_code, timeout, attempt + 1)
         raise e
 
+def retry_after(e):
+    if isinstance(e, openai.RateLimitError):
+        return parse_retry_after(e.response.headers)
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)):
+        return 0
+    return None
+
 def add_import_statements_file(model, api_key, java_file):
     input_code, imports = remove_import_file(java_file)
     print(f"prompting gpt with {input_code} {imports}")
     return add_import_statements(model, api_key, input_code)
 
-def process_files(model, input_folder, api_key, output_folder="./"):
+def process_files(model, input_folder, api_key, output_folder="./", concurrency=INFER_CONCURRENCY):
     output_folder_name = os.path.join(output_folder, model.replace(":", "-") + "-output-" + os.path.basename(os.path.normpath(input_folder)))
     if not os.path.exists(output_folder_name):
         os.makedirs(output_folder_name)
+    manifest = BuildManifest(output_folder_name, {'model': model, 'options': OPTIONS, 'prompt': prompt('')})
 
-    java_files = get_java_files(input_folder)
-    for java_file in java_files:
+    def process_java_file(java_file):
         input_path = os.path.join(input_folder, java_file)
-        output_path = os.path.join(output_folder_name, java_file)
-        if os.path.exists(output_path):
-            continue
-
-        response = add_import_statements_file(model, api_key, input_path)
-        write_file(output_path, response)
+        response = with_backoff(lambda: add_import_statements_file(model, api_key, input_path), retry_after)
+        manifest.write(java_file, response, [input_path])
         print(f"Processed {java_file}")
 
+    java_files = [f for f in get_java_files(input_folder)
+                  if not manifest.is_up_to_date(f, [os.path.join(input_folder, f)])]
+    run_concurrently(java_files, process_java_file, concurrency)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Process Java files to add import statements using OpenAI ChatGPT.')
     parser.add_argument('model', type=str, help='The openai model to use')
     parser.add_argument('input_folder', type=str, help='The input folder containing Java files.')
     parser.add_argument('api_key', type=str, help='Your OpenAI API key.')
     parser.add_argument('output_folder', nargs='?', default='./', help='The output folder to save processed data (default: "./")')
+    parser.add_argument('--jobs', type=int, default=INFER_CONCURRENCY, help=f'Number of concurrent requests (default: {INFER_CONCURRENCY})')
 
     args = parser.parse_args()
 
-    process_files(args.model, args.input_folder, args.api_key, args.output_folder)
+    process_files(args.model, args.input_folder, args.api_key, args.output_folder, args.jobs)
@@ -3,22 +3,35 @@
 import sys
 import os
 import json
+import queue
+import re
+import socket
 import subprocess
+import threading
+import time
 import traceback
-
-import requests
+import urllib.parse
 
 from java_import_util import remove_import_file
+from response_cache import cached
+from build_manifest import BuildManifest, write_atomic
 
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
-host = os.getenv('SNR_HOST', 'http://localhost:8080').rstrip('/')
-java_d_options = os.getenv('java_d_options')
+# Address of a running SnRWorker (e.g. localhost:8080). When unset, SNR_WORKERS local workers are started.
+host = os.getenv('SNR_HOST')
+# Number of warm SnR JVMs; 0 starts a new JVM for every snippet
+SNR_WORKERS = int(os.getenv('SNR_WORKERS', '1'))
+# SnR requests the workers answer between two kills of SnR's database queries
+SNR_KILL_QUERIES_EVERY = int(os.getenv('SNR_KILL_QUERIES_EVERY', '50'))
 
-if java_d_options is None:
-    raise Exception("java_d_options not set")
-java_d_options = ' '.join(f'"{option}"' for option in java_d_options.split())
+def get_java_d_options() -> str:
+    # Checked when SnR is used, so importing this module does not require it
+    java_d_options = os.getenv('java_d_options')
+    if java_d_options is None:
+        raise Exception("java_d_options not set")
+    return ' '.join(f'"{option}"' for option in java_d_options.split())
 
 RETRY_MAX = 5
 retry_counter = 0
@@ -74,14 +87,219 @@ def add_import_statements_file(java_file, timeout=None):
     print(f"prompting snr with {java_file} {input_code} {imports}")
     return add_import_statements(input_code, timeout=timeout)
 
-def add_import_statements(input_code, timeout=None):
-    cmd = f'java {java_d_options} ' + \
-          " -cp '" + \
-          os.path.join(__location__, 'snr', 'snr-server-0.0.1-SNAPSHOT.jar') + ':' + \
-          os.path.join(__location__, 'snr', 'lib', '*') + "'" + \
-          ' org.javelus.snr.compile.SnRBuilder '
-    result = run_cmd(cmd, input=input_code)
-    run_query_in_db('KILL HARD USER snr;')
+def add_import_statements(input_code, timeout=None, attempt=0):
+    # Failed runs come back with empty content and are not worth keeping
+    return tuple(cached('snr', [input_code], {'java_d_options': get_java_d_options()},
+                        lambda: run_snr(input_code, timeout=timeout),
+                        store_if=lambda result: bool(result[0]), attempt=attempt))
+
+def get_snr_classpath():
+    return ':'.join([
+        os.path.join(__location__, 'snr', 'snr-server-0.0.1-SNAPSHOT.jar'),
+        os.path.join(__location__, 'snr', 'lib', '*'),
+    ])
+
+def get_worker_classpath():
+    return ':'.join([
+        os.path.join(__location__, 'target', 'inference-leaker-1.0-SNAPSHOT.jar'),
+        os.path.join(__location__, 'target', 'lib', '*'),
+    ])
+
+_java_version = None
+
+def get_java_version() -> int:
+    """The feature release of the `java` on the PATH, e.g. 8 or 17"""
+    global _java_version
+    if _java_version is None:
+        match = re.search(r'version "(\d+)(?:\.(\d+))?', run_cmd('java -version').stderr)
+        if match is None:
+            _java_version = 0
+        else:
+            _java_version = int(match.group(1)) if match.group(1) != '1' else int(match.group(2) or 0)
+    return _java_version
+
+def can_trap_exit() -> bool:
+    # SnRWorker traps the builder's System.exit with a SecurityManager, which JDK 24 removed
+    return get_java_version() < 24
+
+def get_security_manager_option() -> str:
+    # JDK 18 to 23 refuse System.setSecurityManager unless allowed at startup; before 12 the value named a class
+    return '-Djava.security.manager=allow' if 17 <= get_java_version() < 24 else ''
+
+class SnRWorker:
+    """One warm SnR JVM running com.g191919.inferenceleaker.SnRWorker.
+
+    Requests and responses are single JSON lines, sent over the worker's
+    stdin/stdout or over a TCP connection to an already running worker.
+    Other lines the JVM prints are skipped. The worker is restarted when it
+    dies, misses a timeout or answers out of step.
+    """
+    def __init__(self, address=None):
+        self.address = address
+        self.proc = None
+        self.sock = None
+        self.rfile = None
+        self.wfile = None
+        self.lines = None
+        self.request_id = 0
+
+    def start(self):
+        if self.address is None:
+            # SnR is loaded from snr.classpath in a class loader per request, so no static state outlives a snippet
+            cmd = (f"exec java {get_java_d_options()} {get_security_manager_option()} "
+                   f"-Dsnr.classpath='{get_snr_classpath()}' -cp '{get_worker_classpath()}' "
+                   f"com.g191919.inferenceleaker.SnRWorker")
+            print('Starting SnR worker: ' + cmd)
+            self.proc = subprocess.Popen(cmd, shell=True, cwd=__location__, text=True, encoding='utf-8',
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self.rfile, self.wfile = self.proc.stdout, self.proc.stdin
+        else:
+            self.sock = socket.create_connection(self.address)
+            self.rfile = self.sock.makefile('r', encoding='utf-8')
+            self.wfile = self.sock.makefile('w', encoding='utf-8')
+        # Responses are read on a separate thread so that requests can time out
+        self.lines = queue.Queue()
+        threading.Thread(target=self.read_lines, args=(self.rfile, self.lines), daemon=True).start()
+
+    @staticmethod
+    def read_lines(rfile, lines):
+        try:
+            for line in rfile:
+                lines.put(line)
+        except (OSError, ValueError):
+            pass
+        lines.put(None)
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+        if self.sock is not None:
+            self.sock.close()
+        self.proc = None
+        self.sock = None
+        self.lines = None
+
+    def run(self, input_code, timeout=None) -> ExecutionResults:
+        if self.lines is None:
+            self.start()
+        self.request_id += 1
+        request_id = str(self.request_id)
+        try:
+            self.wfile.write(json.dumps({'id': request_id, 'code': input_code}) + '\n')
+            self.wfile.flush()
+            response = self.read_response(timeout)
+        except queue.Empty:
+            self.stop()
+            return ExecutionResults(-1, "", f"SnR worker timed out after {timeout}s")
+        except OSError as e:
+            self.stop()
+            return ExecutionResults(-1, "", f"SnR worker failed: {e}")
+        if response is None:
+            self.stop()
+            return ExecutionResults(-1, "", "SnR worker exited")
+        if response['id'] != request_id:
+            # Out of step with the worker, every later response would belong to another request
+            self.stop()
+            return ExecutionResults(-1, "", f"SnR worker answered request {response['id']} instead of {request_id}")
+        return ExecutionResults(response['exitCode'], response['stdout'], response['stderr'])
+
+    def read_response(self, timeout=None):
+        """The next response line, skipping other output of the JVM. None once the worker exited."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            line = self.lines.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+            if line is None:
+                return None
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"SnR worker printed: {line.rstrip()}")
+                continue
+            if isinstance(response, dict) and 'id' in response:
+                return response
+            print(f"SnR worker printed: {line.rstrip()}")
+
+class SnRWorkerPool:
+    """Hands each request to an idle worker.
+
+    SnR's database queries are killed every SNR_KILL_QUERIES_EVERY requests,
+    and after a worker was stopped, since a killed JVM leaves its queries
+    running. The kill hits every connection of the snr user, so it waits
+    until no worker is answering a request.
+    """
+    def __init__(self, size, address=None, kill_every=SNR_KILL_QUERIES_EVERY):
+        self.size = size
+        self.kill_every = kill_every
+        self.workers = queue.Queue()
+        for _ in range(size):
+            self.workers.put(SnRWorker(address))
+        self.lock = threading.Lock()
+        self.kill_lock = threading.Lock()
+        self.since_kill = 0
+
+    def run(self, input_code, timeout=None) -> ExecutionResults:
+        worker = self.workers.get()
+        try:
+            result = worker.run(input_code, timeout=timeout)
+            stopped = worker.lines is None
+        finally:
+            self.workers.put(worker)
+        with self.lock:
+            self.since_kill += 1
+            due = stopped or self.since_kill >= self.kill_every
+        if due:
+            self.kill_queries()
+        return result
+
+    def kill_queries(self):
+        with self.kill_lock:
+            idle = [self.workers.get() for _ in range(self.size)]
+            try:
+                with self.lock:
+                    self.since_kill = 0
+                run_query_in_db('KILL HARD USER snr;')
+            finally:
+                for worker in idle:
+                    self.workers.put(worker)
+
+snr_pool = None
+snr_pool_lock = threading.Lock()
+
+def get_snr_pool() -> SnRWorkerPool:
+    global snr_pool
+    with snr_pool_lock:
+        if snr_pool is None:
+            address = None
+            if host is not None:
+                url = urllib.parse.urlsplit(host if '://' in host else f'tcp://{host}')
+                address = (url.hostname, url.port)
+            snr_pool = SnRWorkerPool(max(SNR_WORKERS, 1), address)
+    return snr_pool
+
+_use_workers = None
+
+def use_workers() -> bool:
+    global _use_workers
+    if _use_workers is None:
+        _use_workers = host is not None or SNR_WORKERS > 0
+        if host is None and _use_workers and not can_trap_exit():
+            print(f"JDK {get_java_version()} cannot trap SnR's System.exit, starting a JVM per snippet")
+            _use_workers = False
+    return _use_workers
+
+def run_snr(input_code, timeout=None):
+    if use_workers():
+        result = get_snr_pool().run(input_code, timeout=timeout)
+    else:
+        cmd = f'java {get_java_d_options()} ' + \
+              " -cp '" + \
+              os.path.join(__location__, 'snr', 'snr-server-0.0.1-SNAPSHOT.jar') + ':' + \
+              os.path.join(__location__, 'snr', 'lib', '*') + "'" + \
+              ' org.javelus.snr.compile.SnRBuilder '
+        result = run_cmd(cmd, input=input_code)
+        # The JVM is gone, but a timed out one may have left its queries running
+        run_query_in_db('KILL HARD USER snr;')
     if result.exit_code != 0:
         print(result)
         return "", result.stdout, result.stderr
@@ -90,7 +308,6 @@ def add_import_statements(input_code, timeout=None):
         return rjson['updatedContent'], result.stdout, result.stderr
     return "", result.stdout, result.stderr
 
-
 def process_files(input_folder, output_folder="./", log_folder=None):
     output_folder_name = os.path.join(output_folder, "snr-output-" + os.path.basename(os.path.normpath(input_folder)))
     if log_folder is None:
@@ -100,21 +317,21 @@ def process_files(input_folder, output_folder="./", log_folder=None):
         os.makedirs(output_folder_name)
     if not os.path.exists(log_folder_name):
         os.makedirs(log_folder_name)
+    manifest = BuildManifest(output_folder_name, {'model': 'snr', 'java_d_options': get_java_d_options()})
 
     java_files = get_java_files(input_folder)
     for java_file in java_files:
         input_path = os.path.join(input_folder, java_file)
-        output_path = os.path.join(output_folder_name, java_file)
         stdout_path = os.path.join(log_folder_name, java_file + ".stdout.txt")
         stderr_path = os.path.join(log_folder_name, java_file + ".stderr.txt")
-        if os.path.exists(output_path):
+        if manifest.is_up_to_date(java_file, [input_path]):
             continue
 
         try:
             response, stdout, stderr = add_import_statements_file(input_path)
-            write_file(output_path, response)
-            write_file(stdout_path, stdout)
-            write_file(stderr_path, stderr)
+            write_atomic(stdout_path, stdout)
+            write_atomic(stderr_path, stderr)
+            manifest.write(java_file, response, [input_path])
             print(f"{response}")
             print(f"Processed {java_file}")
         except Exception as e:
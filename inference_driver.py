@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import os
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# Number of files sent to the model at the same time; 1 sends them one by one, in order
+INFER_CONCURRENCY = int(os.getenv('INFER_CONCURRENCY', '1'))
+# Retries of a request that was rate limited (HTTP 429) or timed out
+RATE_LIMIT_RETRIES = int(os.getenv('RATE_LIMIT_RETRIES', '5'))
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+
+class TokenBucket:
+    """Allows RATE units per minute, with bursts of up to CAPACITY units (default: RATE)."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate / 60.0
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> None:
+        # A request larger than the bucket would wait forever; let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Limits requests per minute and (estimated) tokens per minute. A limit of 0 disables it."""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+    def acquire(self, tokens: int = 0) -> None:
+        if self.requests is not None:
+            self.requests.acquire()
+        if self.tokens is not None and tokens > 0:
+            self.tokens.acquire(tokens)
+
+
+def with_backoff(f: Callable[[], T], retry_after: Callable[[Exception], Optional[float]],
+                 retries: int = RATE_LIMIT_RETRIES) -> T:
+    """Call F, retrying with exponential backoff and jitter while RETRY_AFTER(error) is not None.
+    RETRY_AFTER returns the delay the server asked for (0 if it did not say) or None if the error is final."""
+    attempt = 0
+    while True:
+        try:
+            return f()
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is None or attempt >= retries:
+                raise
+            delay = max(delay, min(BACKOFF_MAX, BACKOFF_BASE ** attempt) * random.uniform(0.5, 1.5))
+            print(f"{type(e).__name__}: retrying in {delay:.2f} seconds...")
+            time.sleep(delay)
+            attempt += 1
+
+
+def run_concurrently(items: Iterable[T], f: Callable[[T], None],
+                     concurrency: int = INFER_CONCURRENCY) -> None:
+    """Call F on every item with at most CONCURRENCY calls in flight.
+    F writes its own output, so results land on disk as they complete. A failure is
+    reported when it happens and raised once every item is done, so the other
+    outputs are still written but the run does not look successful."""
+    def run(item):
+        try:
+            f(item)
+            return item, None
+        except Exception as e:
+            return item, e
+
+    failures = list()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(run, item) for item in items]
+        for future in concurrent.futures.as_completed(futures):
+            item, error = future.result()
+            if error is not None:
+                print(f"Failed {item}: {type(error).__name__}: {error}")
+                failures.append((futures.index(future), item, error))
+    # In the order of the items, whatever order they failed in
+    failures = [(item, error) for _, item, error in sorted(failures, key=lambda failure: failure[0])]
+    if len(failures) == 1:
+        raise failures[0][1]
+    if failures:
+        raise Exception(f"{len(failures)} of {len(futures)} items failed: "
+                        f"{', '.join(str(item) for item, _ in failures)}") from failures[0][1]
+
+
+def estimate_tokens(text: str, max_output_tokens: int = 0) -> int:
+    # About 4 characters per token for code and English
+    return len(text) // 4 + max_output_tokens
+
+
+def parse_retry_after(headers) -> float:
+    try:
+        return float(headers.get('retry-after', 0) or 0)
+    except (TypeError, ValueError, AttributeError):
+        return 0
@@ -1,20 +1,53 @@
 import locale
 import os
-from typing import List, Tuple, Union, re
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 
 
-def remove_import(lines: List[str]) -> Tuple[str, List[str]]:
-    new_str = ''
+class ImportStatement(NamedTuple):
+    # e.g. java.util.List, java.util.* or java.util.Collections.sort
+    name: str
+    static: bool
+
+    @property
+    def wildcard(self) -> bool:
+        return self.name.endswith('*')
+
+
+# One import per line, "import" followed by a name without spaces, e.g. "import java.util.*;"
+IMPORT_PATTERN = re.compile(r'\s*import \s*(?P<name>[^ ]*);\s*')
+STATIC_IMPORT_PATTERN = re.compile(r'\s*import\s+static\s+(?P<name>[^\s;]+)\s*;\s*')
+
+
+def parse_import(line: str) -> Optional[ImportStatement]:
+    match = IMPORT_PATTERN.fullmatch(line)
+    if match is not None:
+        return ImportStatement(match['name'].strip(), False)
+    match = STATIC_IMPORT_PATTERN.fullmatch(line)
+    if match is not None:
+        return ImportStatement(match['name'], True)
+    return None
+
+
+def scan_imports(lines: Iterable[str]) -> Iterator[Tuple[str, Optional[ImportStatement]]]:
+    """Each line of LINES, e.g. an open file, with the import statement it holds or None."""
+    for line in lines:
+        yield line, parse_import(line)
+
+
+def remove_import(lines: Iterable[str]) -> Tuple[str, List[str]]:
+    """The code without its import statements, and the imported names.
+    Static imports are not type imports: they stay in the code."""
+    code: List[str] = []
     imports: List[str] = []
     for line in lines:
-        if line.strip().startswith("import ") \
-                and ' ' not in line.strip()[6:].strip() \
-                and line.strip()[6:].endswith(';'):
-            imports.append(line.strip()[6:-1].strip())
-            continue
+        # Most lines are code, skip the pattern for them
+        statement = parse_import(line) if 'import' in line else None
+        if statement is None or statement.static:
+            code.append(line)
         else:
-            new_str = new_str + line
-    return new_str.strip(), imports
+            imports.append(statement.name)
+    return ''.join(code).strip(), imports
 
 
 def remove_import_file(file: str, encoding=locale.getpreferredencoding()) -> Tuple[str, List[str]]:
@@ -22,7 +55,7 @@ def remove_import_file(file: str, encoding=locale.getpreferredencoding()) -> Tup
         return '', []
     try:
         with open(file, encoding=encoding) as f:
-            return remove_import(f.readlines())
+            return remove_import(f)
     except UnicodeDecodeError:
         return remove_import_file(file, encoding="ISO-8859-15")
 
@@ -32,22 +65,66 @@ IGNORED_IMPORT: List[Union[str, re.Pattern]] = [
 ]
 
 
+def scoped_pattern(pattern: re.Pattern) -> str:
+    """PATTERN as a string that keeps its flags when joined with other patterns"""
+    flags = ''.join(letter for flag, letter in [(re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x')]
+                    if pattern.flags & flag)
+    return f'(?{flags}:{pattern.pattern})' if flags else pattern.pattern
+
+
+class ImportClassifier:
+    """Decides for an imported name whether it is ignored and which library group it is in.
+
+    IGNORED holds names, compared exactly, and patterns, which must match the
+    whole name. GROUPS are substrings; a name is in the first group, in list
+    order, that it contains. Both are compiled into one pattern each, and
+    the answer for every name is remembered.
+    """
+
+    def __init__(self, ignored: List[Union[str, re.Pattern]], groups: List[str] = ()):
+        self.groups = list(groups)
+        alternatives = [scoped_pattern(ignore) if isinstance(ignore, re.Pattern) else re.escape(str(ignore).strip())
+                        for ignore in ignored]
+        self.ignored_pattern = re.compile('|'.join(f'(?:{a})' for a in alternatives)) if alternatives else None
+        # The lookahead finds every occurrence of every group, even overlapping ones
+        self.group_pattern = re.compile('(?=(' + '|'.join(map(re.escape, self.groups)) + '))') if self.groups else None
+        self.priority = {group: i for i, group in enumerate(self.groups)}
+        self.cache: Dict[str, Tuple[bool, Optional[str]]] = dict()
+
+    def classify(self, item) -> Tuple[bool, Optional[str]]:
+        """(ignored, group) of ITEM, the group is None if ITEM is in none of them"""
+        name = str(item)
+        result = self.cache.get(name)
+        if result is None:
+            ignored = self.ignored_pattern is not None and self.ignored_pattern.fullmatch(name.strip()) is not None
+            group = None
+            if self.group_pattern is not None:
+                found = self.group_pattern.findall(name)
+                if found:
+                    group = min(found, key=self.priority.__getitem__)
+            result = self.cache[name] = (ignored, group)
+        return result
+
+    def ignored(self, item) -> bool:
+        return self.classify(item)[0]
+
+    def group(self, item) -> Optional[str]:
+        return self.classify(item)[1]
+
+
+_ignored_classifier: Optional[ImportClassifier] = None
+
+
 def ignored_import(item) -> bool:
-    for ignore in IGNORED_IMPORT:
-        match: bool = True
-        if isinstance(ignore, re.Pattern):
-            if ignore.fullmatch(str(item).strip()) is None:
-                match = False
-        else:
-            if str(item).strip() != str(ignore).strip():
-                match = False
-        if match:
-            return True
-    return False
+    global _ignored_classifier
+    if _ignored_classifier is None:
+        # Compiled on first use, IGNORED_IMPORT must not change afterwards
+        _ignored_classifier = ImportClassifier(IGNORED_IMPORT)
+    return _ignored_classifier.ignored(item)
 
 
 def filter_ignored_imports(imports: List[str]) -> List[str]:
-    return list(filter(lambda a: not ignored_import(a), imports))
+    return [a for a in imports if not ignored_import(a)]
 
 
 def match_import(actual_imports: List[str], expected_imports: List[str]) -> List[str]:
@@ -56,3 +133,7 @@ def match_import(actual_imports: List[str], expected_imports: List[str]) -> List
         if imported_path in expected_imports:
             intersection.append(imported_path)
     return intersection
+
+
+def expand_star(actual, expected):
+    return actual
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from build_manifest import BuildManifest, digest_file
+
+CLASSPATH = 'target/inference-leaker-1.0-SNAPSHOT.jar:target/lib/*'
+
+
+def get_java_files(input_folder):
+    return [f for f in os.listdir(input_folder) if f.endswith('.java')]
+
+
+def get_recipe(transform: str, classpath=CLASSPATH) -> Dict[str, str]:
+    """Identity of a transformation: its stages and the jar that implements them."""
+    jar = classpath.split(':')[0]
+    return {'transform': transform, 'jar': digest_file(jar)}
+
+
+def temp_output_path(output_folder: str, java_file: str) -> str:
+    return os.path.join(output_folder, f'.{java_file}.{os.getpid()}.tmp')
+
+
+def chunk(items: List, n: int) -> List[List]:
+    """Split ITEMS into at most N contiguous chunks of nearly equal size."""
+    n = max(1, min(n, len(items)))
+    chunks = list()
+    start = 0
+    for i in range(n):
+        end = start + (len(items) - start) // (n - i)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def run_batch_transform(transform: str, pairs: List[Tuple[str, str]], classpath=CLASSPATH) -> List[Dict[str, str]]:
+    """Run com.g191919.inferenceleaker.BatchTransform once over all (input, output) PAIRS."""
+    manifest = ''.join(f'{input_path}\t{output_path}\n' for input_path, output_path in pairs)
+    result = subprocess.run(
+        ['java', '-cp', classpath, 'com.g191919.inferenceleaker.BatchTransform', transform],
+        input=manifest.encode(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=os.environ.copy()
+    )
+    statuses = [json.loads(line) for line in result.stdout.decode().splitlines() if line.strip()]
+    if result.returncode != 0 or len(statuses) != len(pairs):
+        print(f"Error during execution: {result.stderr.decode()}", file=sys.stderr)
+    return statuses
+
+
+def run_json_transform(stages: str, codes: Dict[str, str], classpath=CLASSPATH) -> Dict[str, Dict]:
+    """Run BatchTransform --json once over CODES (id -> source code).
+    Returns id -> status, where a successful status holds the output of every stage in 'stages'."""
+    requests = ''.join(json.dumps({'id': code_id, 'code': code}) + '\n' for code_id, code in codes.items())
+    result = subprocess.run(
+        ['java', '-cp', classpath, 'com.g191919.inferenceleaker.BatchTransform', '--json', stages],
+        input=requests.encode(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=os.environ.copy()
+    )
+    statuses = dict()
+    for line in result.stdout.decode().splitlines():
+        if line.strip():
+            status = json.loads(line)
+            statuses[status['id']] = status
+    for code_id in codes:
+        if code_id not in statuses:
+            statuses[code_id] = {'id': code_id, 'status': 'error', 'stages': None,
+                                 'message': f"No result, exit code {result.returncode}: {result.stderr.decode()}"}
+    return statuses
+
+
+def process_files(transform: str, input_folder: str, output_folder: str, classpath=CLASSPATH, jobs=None):
+    """Transform every Java file of INPUT_FOLDER into OUTPUT_FOLDER.
+    The files are split into one chunk per core and each chunk is handled by one JVM.
+    The JVMs write to temporary files that are renamed once complete."""
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    manifest = BuildManifest(output_folder, get_recipe(transform, classpath))
+
+    pairs = list()
+    for java_file in get_java_files(input_folder):
+        input_path = os.path.join(input_folder, java_file)
+        if manifest.is_up_to_date(java_file, [input_path]):
+            continue
+        output_path = temp_output_path(output_folder, java_file)
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+        pairs.append((input_path, output_path))
+    if not pairs:
+        return
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for statuses in executor.map(lambda c: run_batch_transform(transform, c, classpath), chunk(pairs, jobs)):
+            for status in statuses:
+                java_file = os.path.basename(status['input'])
+                if status['status'] == 'error':
+                    print(f"Error during execution: {java_file}: {status['message']}")
+                    continue
+                os.replace(status['output'], os.path.join(output_folder, java_file))
+                manifest.record(java_file, [status['input']])
+                print(f"Processed {java_file}")
+
+
+if __name__ == "__main__":
+    print(process_files(sys.argv[-3], sys.argv[-2], sys.argv[-1]))
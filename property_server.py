@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from typing import Callable
+
+# Shared with r_property_check.py
+ENV_PREFIX = 'R_PROPERTY_'
+SOCKET_ENV = f'{ENV_PREFIX}SOCKET'
+FILE_ENV = f'{ENV_PREFIX}FILE'
+# Like r_property_check.retry_f: a failing candidate is checked again this many times
+RETRIES = 3
+
+
+class PropertyServer:
+    """Answers Perses' property checks from the reducing process over a Unix socket.
+
+    Perses runs this file as its test script for every candidate. The script
+    only sends the candidate's path to the server and exits with the status
+    it gets back, so the model clients, tokenizers and the response cache
+    stay loaded across all candidates of a reduction.
+    CHECK gets the candidate's code and the attempt number, which keeps the
+    model responses of a retry apart from the cached ones that failed, and
+    returns True if the candidate keeps the property.
+    """
+
+    def __init__(self, socket_path: str, check: Callable[[str, int], bool], retries: int = RETRIES):
+        self.socket_path = socket_path
+        self.check = check
+        self.retries = retries
+        self.checks = 0
+        self.passes = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def check_file(self, path: str) -> int:
+        start = time.time()
+        result = False
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                code = file.read()
+            for attempt in range(0, self.retries + 1):
+                try:
+                    result = self.check(code, attempt)
+                except Exception as e:
+                    traceback.print_exception(e)
+                    result = False
+                if result:
+                    break
+        except OSError as e:
+            print(f"Cannot read candidate {path}: {e}")
+        with self.lock:
+            self.checks += 1
+            self.passes += result
+            self.seconds += time.time() - start
+        return 0 if result else 1
+
+    def start(self) -> None:
+        property_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if not line:
+                    return
+                request = json.loads(line)
+                exit_code = property_server.check_file(request['file'])
+                self.wfile.write((json.dumps({'exit_code': exit_code}) + '\n').encode('utf-8'))
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        print(f"Property server: {self.checks} checks, {self.passes} passed, {self.seconds:.2f}s")
+
+    def env(self, file_name: str) -> dict:
+        """Environment for Perses, whose test script is this file."""
+        new_env = os.environ.copy()
+        new_env[SOCKET_ENV] = self.socket_path
+        new_env[FILE_ENV] = file_name
+        return new_env
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main() -> int:
+    """Client side, run by Perses in the directory holding the candidate."""
+    path = os.path.abspath(os.environ[FILE_ENV])
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(os.environ[SOCKET_ENV])
+            client.sendall((json.dumps({'file': path}) + '\n').encode('utf-8'))
+            response = client.makefile('r', encoding='utf-8').readline()
+        return json.loads(response)['exit_code']
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Property server unavailable: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,8 @@ import subprocess
 from typing import List
 
 ENV_PREFIX = 'R_PROPERTY_'
+# The retry of the command, so that it asks the model again instead of reading the cached answer
+ATTEMPT_ENV = f'{ENV_PREFIX}ATTEMPT'
 
 def new_envs(command: str, args: List[str]):
     new_env = os.environ.copy()
@@ -27,13 +29,13 @@ def logged_f(f) -> int:
 def retry_f(f,retries=3) -> int:
     exit_code = None
     assert retries
-    for _ in range(0, retries+1):
-        exit_code = f()
+    for attempt in range(0, retries+1):
+        exit_code = f(attempt)
         if exit_code == 0:
             return exit_code
     return exit_code
 
-def main() -> int:
+def main(attempt=0) -> int:
     # Print the current working directory
     print(f"Current Directory: '{os.getcwd()}'")
 
@@ -70,7 +72,8 @@ def main() -> int:
     try:
         # Run the command using subprocess.Popen without shell=True
         print(f"Running command with args {command_list}")
-        process = subprocess.Popen(command_list, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        process = subprocess.Popen(command_list, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                   env={**os.environ, ATTEMPT_ENV: str(attempt)})
 
         # Wait for the process to finish and get the exit code
         stdout, stderr = process.communicate()
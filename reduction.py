@@ -10,27 +10,41 @@ import subprocess
 import sys
 import time
 import tempfile
+import threading
 import traceback
 import json
+import operator
 import time
 import datetime
 from collections import OrderedDict
 from typing import List, Any, Tuple
 
-import openai
-
+import backends
 from ABCDD import AbstractDD
-from compare_results import expand_star
-from infer_ollama import add_import_statements as add_import_ollama, reload_model
-from infer_openai import add_import_statements as add_import_openai
-from infer_snr import add_import_statements as add_import_snr
-from java_import_util import remove_import
-from tokenize_llm import get_decoder, Tokenizer
+from HDD import HDD
+from PersesDD import PersesDD
+from java_import_util import remove_import, expand_star
+from tokenize_llm import get_decoder, Tokenizer, TokenTable
 from r_property_check import new_envs
+from property_server import PropertyServer
+import response_cache
+from build_manifest import BuildManifest, write_atomic
+from prompt import prompt
 
 __location__ = os.path.realpath(
     os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
+# Number of ddmin tests sent to the model at the same time
+REDUCTION_PARALLEL = int(os.getenv('REDUCTION_PARALLEL', '1'))
+# perses_ddmin: Perses, then ddmin over the model's tokens
+# pyperses_ddmin: the in-process Perses-style reducer of PersesDD.py, then ddmin over the model's tokens
+# hdd_ddmin: hierarchical ddmin over Java blocks and statements, then ddmin over the model's tokens
+REDUCTION_STRATEGY = os.getenv('REDUCTION_STRATEGY', 'perses_ddmin')
+# Answer Perses' property checks from this process instead of starting check_expected_imports.py per candidate
+PERSES_PROPERTY_SERVER = os.getenv('PERSES_PROPERTY_SERVER', '1') == '1'
+# Retries of the ddmin after the first reducer, and of the ddmin of the whole input if it fails
+DDMIN_MAX_RETRIES = 5
+
 def get_time_stamp() -> str:
     return datetime.datetime.now().isoformat()
 
@@ -49,11 +63,11 @@ def exit_handler():
     write_file(f'reduction.{prefix}{get_time_stamp()}.log', data)
 
 
-def test_r(expected_imports: List[str], inferred: str, repeat=0) -> bool:
+def test_r(expected_imports: List[str], inferred: str, repeat=0, report=print) -> bool:
     def _test_r(expected_imports: List[str], inferred: str) -> bool:
         code, fqns = remove_import(read_lines(inferred))
         fqns = expand_star(fqns, expected_imports)
-        print(f"inferred: {inferred}\nfqns: {fqns}")
+        report(f"inferred: {inferred}\nfqns: {fqns}")
         all_inferred = True
         for expected in expected_imports:
             if expected not in fqns:
@@ -69,21 +83,61 @@ def test_r(expected_imports: List[str], inferred: str, repeat=0) -> bool:
     return result
 
 class LLMDD(AbstractDD):
-    def __init__(self, expected_imports: List[str], decoder: Tokenizer, infer_f):
-        super().__init__()
+    def __init__(self, expected_imports: List[str], decoder: Tokenizer, infer_f, parallel=1):
+        super().__init__(parallel=parallel)
         self.expected_imports = expected_imports
         self.decoder = decoder
         self.infer_f = infer_f
+        self.token_table = None
+        # Tests prefetched on worker threads keep their output here, and test() prints it
+        # on the coordinating thread, so the output of parallel tests does not interleave
+        self.coordinator = threading.current_thread()
+        self.local = threading.local()
+        self.reports = dict()
 
     def join_tokens(self, tokens: List[Any]):
         """Take in list of tokens. Convert from token int back to string and then test"""
         return self.decoder.decode(tokens)
 
+    def prepare_tokens(self, lo_tokens: List[Any]):
+        self.token_table = TokenTable(self.decoder, lo_tokens)
+        self.reports = dict()
+
+    def join_config(self, c):
+        """Join from the bytes of the original tokens instead of decoding again"""
+        if self.token_table is None:
+            return super().join_config(c)
+        return self.token_table.join(tuple(map(operator.itemgetter(0), c)))
+
     def test_joined(self, joined) -> bool:
         """Prompt LLM. True if contains all the necessary Import Statements"""
-        print(f"Test: {joined}")
+        report = getattr(self.local, 'report', None)
+        say = print if report is None else report.append
+        say(f"Test: {joined}")
         inferred = self.infer_f(joined)
-        return test_r(self.expected_imports, inferred)
+        return test_r(self.expected_imports, inferred, report=say)
+
+    @staticmethod
+    def report_key(c):
+        return tuple(i for i, _ in c)
+
+    def _test(self, c):
+        if threading.current_thread() is self.coordinator:
+            return super()._test(c)
+        report = self.local.report = list()
+        try:
+            return super()._test(c)
+        finally:
+            self.local.report = None
+            self.reports[self.report_key(c)] = '\n'.join(report)
+
+    def test(self, c):
+        outcome = super().test(c)
+        # c is sorted now, like the configurations the worker threads got
+        report = self.reports.pop(self.report_key(c), None)
+        if report is not None:
+            print(report)
+        return outcome
 
 def get_java_files(input_folder):
     files = [f for f in os.listdir(input_folder) if f.endswith('.java')]
@@ -101,25 +155,13 @@ def write_file(filepath, content):
 def read_lines(input_str: str) -> List[str]:
     return input_str.splitlines(keepends=True)
 
-def get_add_import_f(model_name, api_key, timeout=None):
-    match model_name:
-        case 'gpt-4o' | 'gpt-4o-mini':
-            return lambda code: add_import_openai(model_name, api_key, code, timeout=timeout)
-        case 'llama3.1:8b' | 'llama3.1:70b':
-            return lambda code: add_import_ollama(model_name, code, timeout=timeout)
-        case 'snr':
-            return lambda code: add_import_snr(code, timeout=timeout)
-        case _:
-            raise Exception(f"Cannot match model: {model_name}")
+def get_add_import_f(model_name, api_key, timeout=None, attempt=0):
+    """The model's response to a code. A retry passes its ATTEMPT number, so its responses
+    are cached apart from the ones of the attempts that failed."""
+    return backends.get_backend(model_name).add_import(model_name, api_key, timeout, attempt)
 
 def get_reload_model(model_name):
-    match model_name:
-        case 'gpt-4o' | 'gpt-4o-mini':
-            return lambda: None
-        case 'llama3.1:8b' | 'llama3.1:70b':
-            return lambda: reload_model(model_name)
-        case _:
-            raise Exception(f"Cannot match model: {model_name}")
+    return backends.get_backend(model_name).reload(model_name)
 
 def get_v0_import(add_import_f, input_code, skip_remove=False) -> Tuple[str, List[str], int]:
     no_import_code, all_import = remove_import(read_lines(input_code))
@@ -127,12 +169,14 @@ def get_v0_import(add_import_f, input_code, skip_remove=False) -> Tuple[str, Lis
         no_import_code = input_code
 
     print(f"Input No Import: {no_import_code}")
-    add_import_f(no_import_code) # Warm up the cache
-    add_import_f(no_import_code)
-
-    start_time = time.time()
-    v0_response = add_import_f(no_import_code)
-    end_time = time.time()
+    # Time a real model call; a response cache hit would make the timeout meaningless,
+    # and so would warming up the model with cache hits
+    with response_cache.bypass():
+        add_import_f(no_import_code) # Warm up the model
+        add_import_f(no_import_code)
+        start_time = time.time()
+        v0_response = add_import_f(no_import_code)
+        end_time = time.time()
     _, v0_import = remove_import(read_lines(v0_response))
     v0_import = expand_star(v0_import, all_import)
     print(f"Expecting: {all_import}\nv0_response: {v0_response}\nv0_import: {v0_import}")
@@ -157,14 +201,23 @@ def reduce_perses(model_name: str, api_key: str, input_path):
     with tempfile.TemporaryDirectory() as temp_dir:
         print(f"Created temp dir: {temp_dir}")
         no_import_code_path = os.path.join(temp_dir, os.path.basename(input_path))
-        r_path = os.path.join(temp_dir, 'r_property_check.py')
         with open(no_import_code_path, 'w', encoding='utf-8') as f:
             f.write(no_import_code)
-        shutil.copy('r_property_check.py', temp_dir)
 
-        r_command = os.path.realpath(os.path.join(__location__, "check_expected_imports.py"))
-        r_arg = [os.path.basename(input_path), model_name, api_key, str(timeout), *v0_import]
-        perses_env = new_envs(r_command, r_arg)
+        server = None
+        if PERSES_PROPERTY_SERVER:
+            server = PropertyServer(os.path.join(temp_dir, 'property.sock'),
+                                    lambda code, attempt: test_r(v0_import, get_add_import_f(model_name, api_key, timeout=timeout, attempt=attempt)(code)))
+            server.start()
+            r_path = os.path.join(temp_dir, 'property_server.py')
+            shutil.copy(os.path.join(__location__, 'property_server.py'), temp_dir)
+            perses_env = server.env(os.path.basename(input_path))
+        else:
+            r_path = os.path.join(temp_dir, 'r_property_check.py')
+            shutil.copy('r_property_check.py', temp_dir)
+            r_command = os.path.realpath(os.path.join(__location__, "check_expected_imports.py"))
+            r_arg = [os.path.basename(input_path), model_name, api_key, str(timeout), *v0_import]
+            perses_env = new_envs(r_command, r_arg)
 
         command_list = ['java', '-jar', 'perses_deploy.jar', '-i', no_import_code_path, '-t', r_path, '--code-format', 'ORIG_FORMAT']
         try:
@@ -189,21 +242,50 @@ def reduce_perses(model_name: str, api_key: str, input_path):
             print(f"An unexpected error occurred: {e}", file=sys.stderr)
             exit_code = e.returncode
             print(f"Exit_code: {exit_code}")
+        finally:
+            if server is not None:
+                server.stop()
         raise Exception(f"Perses failed")
 
 
-def reduce_token(model_name: str, api_key: str, input_code, retries=0, max_retries=5):
-
-    def add_import_f_catch_timeout(add_import_f, code):
-        try:
-            return add_import_f(code)
-        except TimeoutError as e:
-            return ""
-        except openai.APITimeoutError as e:
+def add_import_f_catch_timeout(add_import_f, code):
+    try:
+        return add_import_f(code)
+    except Exception as e:
+        if backends.is_timeout(e):
             return ""
+        raise e
+
+def reduce_in_process(reducer_class, model_name: str, api_key: str, input_path):
+    """Reduce with REDUCER_CLASS (HDD or PersesDD), testing candidates with LLMDD.test_joined in this process."""
+    input_code = read_file(input_path)
 
-    decoder = get_decoder(model_name)
     add_import_f = get_add_import_f(model_name, api_key)
+    no_import_code, v0_import, duration = get_v0_import(add_import_f, input_code)
+    timeout = duration*2
+    print(f"Timeout for {reducer_class.__name__} set at: {timeout}s")
+    add_import_f = get_add_import_f(model_name, api_key, timeout=timeout)
+
+    llmdd = LLMDD(v0_import, get_decoder(model_name), lambda code: add_import_f_catch_timeout(add_import_f, code))
+    reducer = reducer_class(llmdd.test_joined, parallel=REDUCTION_PARALLEL)
+    start_time = time.time()
+    reduced = reducer.reduce(no_import_code)
+    log(f"{reducer_class.__name__}: {reducer.tests} tests in {time.time() - start_time:.2f}s")
+    print(f"{reducer_class.__name__} reduced: '{reduced}'")
+    return reduced
+
+def reduce_hdd(model_name: str, api_key: str, input_path):
+    return reduce_in_process(HDD, model_name, api_key, input_path)
+
+def reduce_pyperses(model_name: str, api_key: str, input_path):
+    return reduce_in_process(PersesDD, model_name, api_key, input_path)
+
+def reduce_token(model_name: str, api_key: str, input_code, retries=0, max_retries=5, first_attempt=0):
+    """Reduce the model's tokens of INPUT_CODE with ddmin, retried up to MAX_RETRIES times.
+    Attempts are numbered from FIRST_ATTEMPT for the response cache."""
+    decoder = get_decoder(model_name)
+    attempt = first_attempt + retries
+    add_import_f = get_add_import_f(model_name, api_key, attempt=attempt)
 
     original_input_code = input_code
     encode_decode_code = decoder.decode(decoder.encode(original_input_code))
@@ -212,10 +294,10 @@ def reduce_token(model_name: str, api_key: str, input_code, retries=0, max_retri
     timeout = duration*2
     print(f'Timeout for reduce_token set at: {timeout}s')
 
-    add_import_f = get_add_import_f(model_name, api_key, timeout=timeout)
+    add_import_f = get_add_import_f(model_name, api_key, timeout=timeout, attempt=attempt)
 
     try:
-        llmdd = LLMDD(v0_import, decoder, lambda code: add_import_f_catch_timeout(add_import_f, code))
+        llmdd = LLMDD(v0_import, decoder, lambda code: add_import_f_catch_timeout(add_import_f, code), parallel=REDUCTION_PARALLEL)
         reduced_code = llmdd.reduce_lo_tokens(decoder.encode(no_import_code), skip_tests=True, max_retries=0)
         print(f"reduced_code: {reduced_code}")
         return reduced_code, v0_import
@@ -223,7 +305,7 @@ def reduce_token(model_name: str, api_key: str, input_code, retries=0, max_retri
         if retries >= max_retries:
             raise e
         traceback.print_exception(e)
-    return reduce_token(model_name, api_key, input_code, retries=retries+1, max_retries=max_retries)
+    return reduce_token(model_name, api_key, input_code, retries=retries+1, max_retries=max_retries, first_attempt=first_attempt)
 
 def run_perses(model_name, api_key, input_path):
     return reduce_perses(model_name, api_key, input_path)
@@ -242,28 +324,40 @@ def run_repeat(f, model_name, api_key, input_path, retry_i=0, retry_max=0):
     return run_repeat(f, model_name, api_key, input_path, retry_i=retry_i+1, retry_max=retry_max)
 
 def run_perses_ddmin(model_name, api_key, input_path):
+    return run_first_ddmin(run_perses, "Perses", model_name, api_key, input_path, retry_max=5)
+
+def run_pyperses_ddmin(model_name, api_key, input_path):
+    return run_first_ddmin(reduce_pyperses, "PyPerses", model_name, api_key, input_path, retry_max=0)
+
+def run_hdd_ddmin(model_name, api_key, input_path):
+    return run_first_ddmin(reduce_hdd, "HDD", model_name, api_key, input_path, retry_max=0)
+
+def run_first_ddmin(first_f, first_name, model_name, api_key, input_path, retry_max=0):
+    """Reduce with FIRST_F, then with ddmin over the model's tokens."""
     input_code = read_file(input_path)
     no_import_code, all_import = remove_import(read_lines(input_code))
     try:
-        log("Perses started")
-        reduced = run_repeat(run_perses, model_name, api_key, input_path, retry_max=5)
-        log("Perses success")
+        log(f"{first_name} started")
+        reduced = run_repeat(first_f, model_name, api_key, input_path, retry_max=retry_max)
+        log(f"{first_name} success")
     except Exception as e:
         traceback.print_exception(e)
-        log("Perses fail")
+        log(f"{first_name} fail")
         reduced = no_import_code
     try:
-        log("ddmin_perses started")
-        result = reduce_token(model_name, api_key, reduced, max_retries=5)
-        log("ddmin_perses success")
+        log(f"ddmin_{first_name.lower()} started")
+        result = reduce_token(model_name, api_key, reduced, max_retries=DDMIN_MAX_RETRIES)
+        log(f"ddmin_{first_name.lower()} success")
         return result
     except Exception as e:
         traceback.print_exception(e)
-        log("ddmin_perses failed")
+        log(f"ddmin_{first_name.lower()} failed")
     log("reloading model")
     get_reload_model(model_name)()
     log("ddmin_backup started")
-    result = reduce_token(model_name, api_key, input_code, max_retries=5)
+    # After the attempts of the ddmin above, whose candidates can be the same code
+    result = reduce_token(model_name, api_key, input_code, max_retries=DDMIN_MAX_RETRIES,
+                          first_attempt=DDMIN_MAX_RETRIES + 1)
     log("ddmin_backup success")
     return result
 
@@ -272,12 +366,21 @@ def process_files(input_folder, output_folder, model_name, api_key):
     output_folder_name = str(os.path.join(output_folder, model_name.replace(":", "-") + "-reduce-" + os.path.basename(os.path.normpath(input_folder))))
     if not os.path.exists(output_folder_name):
         os.makedirs(output_folder_name)
+    manifest = BuildManifest(output_folder_name, {'model': model_name, 'prompt': prompt(''), 'reduction': REDUCTION_STRATEGY})
+    match REDUCTION_STRATEGY:
+        case 'perses_ddmin':
+            reduce_f = run_perses_ddmin
+        case 'pyperses_ddmin':
+            reduce_f = run_pyperses_ddmin
+        case 'hdd_ddmin':
+            reduce_f = run_hdd_ddmin
+        case _:
+            raise Exception(f"Cannot match reduction strategy: {REDUCTION_STRATEGY}")
 
     java_files = get_java_files(input_folder)
     for java_file in java_files:
         input_path = os.path.join(input_folder, java_file)
-        output_path = os.path.join(output_folder_name, java_file)
-        if os.path.exists(output_path):
+        if manifest.is_up_to_date(java_file, [input_path]):
             continue
         if os.path.exists('./stop_reduction'):
             sys.exit(12)
@@ -287,10 +390,11 @@ def process_files(input_folder, output_folder, model_name, api_key):
         log("reloading model")
         get_reload_model(model_name)()
         log("reduction started")
-        response, v0 = run_repeat(run_perses_ddmin, model_name, api_key, input_path, retry_max=0)
+        response, v0 = run_repeat(reduce_f, model_name, api_key, input_path, retry_max=0)
         log("reduction done")
-        write_file(output_path, response)
-        write_file(os.path.join(output_folder_name, java_file + "_v0"), '\n'.join(v0))
+        write_atomic(os.path.join(output_folder_name, java_file + "_v0"), '\n'.join(v0))
+        manifest.write(java_file, response, [input_path])
+        backends.print_stats()
         print(f"Processed {java_file}")
 
 
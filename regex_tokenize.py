@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+import os
+import re
+import sys
+
+from typing import Dict, Iterator, List, Tuple
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+GRAMMAR_PATH = os.path.join(__location__, 'Java8Lexer.g4')
+
+# Literal rules such as `ARROW : '->';` or `BooleanLiteral: 'true' | 'false';`
+LITERAL_RULE_PATTERN = re.compile(r"^([A-Za-z_]\w*)\s*:\s*('(?:[^'\\]|\\.)*'(?:\s*\|\s*'(?:[^'\\]|\\.)*')*)\s*;", re.MULTILINE)
+LITERAL_PATTERN = re.compile(r"'((?:[^'\\]|\\.)*)'")
+CHAR_RANGE_PATTERN = re.compile(r'\[\\u([0-9A-Fa-f]{4})(?:-\\u([0-9A-Fa-f]{4}))?\]')
+
+# The number rules of Java8Lexer.g4
+DIGITS = r'[0-9](?:[0-9_]*[0-9])?'
+HEX_DIGITS = r'[0-9a-fA-F](?:[0-9a-fA-F_]*[0-9a-fA-F])?'
+EXPONENT = rf'[eE][+-]?{DIGITS}'
+FLOATING_POINT_LITERAL = (rf'0[xX](?:{HEX_DIGITS}\.?|(?:{HEX_DIGITS})?\.{HEX_DIGITS})[pP][+-]?{DIGITS}[fFdD]?'
+                          rf'|{DIGITS}\.(?:{DIGITS})?(?:{EXPONENT})?[fFdD]?'
+                          rf'|\.{DIGITS}(?:{EXPONENT})?[fFdD]?'
+                          rf'|{DIGITS}{EXPONENT}[fFdD]?'
+                          rf'|{DIGITS}[fFdD]')
+INTEGER_LITERAL = (rf'(?:0[xX]{HEX_DIGITS}'
+                   r'|0[bB][01](?:[01_]*[01])?'
+                   r'|0_*[0-7](?:[0-7_]*[0-7])?'
+                   r'|0|[1-9](?:[0-9_]*[0-9])?)[lL]?')
+WS = r'[ \t\r\n\u000C]+'
+
+
+def unescape(literal: str) -> str:
+    return re.sub(r'\\(.)', r'\1', literal)
+
+
+def fragment_class(grammar: str, name: str) -> str:
+    """The regex character class of a fragment made of [\\uXXXX-\\uYYYY] alternatives"""
+    start = grammar.index(f'fragment {name}:')
+    body = grammar[start:grammar.index('\n;', start)]
+    return ''.join(f'\\u{low}' + (f'-\\u{high}' if high else '') for low, high in CHAR_RANGE_PATTERN.findall(body))
+
+
+def build_lexer(grammar_path: str = GRAMMAR_PATH) -> Tuple[re.Pattern, Dict[str, str], Dict[str, str]]:
+    """The master pattern, and the token types of word and symbol literals, from the grammar.
+
+    Each match of the pattern is the longest token at its position, as the ANTLR
+    lexer picks it: floating-point literals before integer literals (a float is
+    never shorter when both match), and symbols longest first. A word is a keyword,
+    BooleanLiteral or NullLiteral if it is one of their literals, else an Identifier.
+    A character no rule matches is skipped, which is how the ANTLR lexer recovers.
+    """
+    with open(grammar_path, 'r', encoding='utf-8') as file:
+        grammar = file.read()
+    identifier_start = fragment_class(grammar, 'IdentifierStart')
+    identifier = f'[{identifier_start}][{identifier_start}{fragment_class(grammar, "IdentifierPart")}]*'
+    identifier_pattern = re.compile(identifier)
+
+    words: Dict[str, str] = dict()
+    symbols: Dict[str, str] = dict()
+    for name, alternatives in LITERAL_RULE_PATTERN.findall(grammar):
+        for literal in map(unescape, LITERAL_PATTERN.findall(alternatives)):
+            table = words if identifier_pattern.fullmatch(literal) else symbols
+            # The first rule wins, as in ANTLR
+            table.setdefault(literal, name)
+
+    symbol = '|'.join(re.escape(s) for s in sorted(symbols, key=len, reverse=True))
+    pattern = re.compile(f'(?P<WS>{WS})'
+                         f'|(?P<FloatingPointLiteral>{FLOATING_POINT_LITERAL})'
+                         f'|(?P<IntegerLiteral>{INTEGER_LITERAL})'
+                         f'|(?P<Identifier>{identifier})'
+                         f'|(?P<symbol>{symbol})'
+                         r'|(?P<error>.)', re.DOTALL)
+    return pattern, words, symbols
+
+
+_lexer = None
+
+
+def get_lexer() -> Tuple[re.Pattern, Dict[str, str], Dict[str, str]]:
+    global _lexer
+    if _lexer is None:
+        _lexer = build_lexer()
+    return _lexer
+
+
+def stream(input_code: str) -> Iterator[Tuple[str, str]]:
+    """(symbolicName, text) of each token, as antlr_tokenize.stream"""
+    pattern, words, symbols = get_lexer()
+    for match in pattern.finditer(input_code):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == 'Identifier':
+            yield words.get(text, 'Identifier'), text
+        elif kind == 'symbol':
+            yield symbols[text], text
+        elif kind != 'error':
+            yield kind, text
+
+
+def tokenize(input_code: str) -> List[Tuple[str, str]]:
+    return list(stream(input_code))
+
+def tokenize_file(file_name: str) -> List[Tuple[str, str]]:
+    with open(file_name, "r", encoding="utf-8") as file:
+        input_code = file.read()
+    return tokenize(input_code)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Tokenize Java 8 source code with the regex lexer.")
+    parser.add_argument("file", nargs="?", type=argparse.FileType("r"), default=sys.stdin,
+                        help="Java source file to tokenize (defaults to stdin)")
+    args = parser.parse_args()
+
+    for type, text in stream(args.file.read()):
+        print(f'{type}: {text}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from typing import Callable, List, Tuple
+
+import antlr_tokenize
+import regex_tokenize
+
+DEFAULT_FOLDERS = ['./snippets/so/', './snippets-thalia/thalia-cs/']
+
+
+def read_snippets(folders: List[str]) -> List[Tuple[str, str]]:
+    snippets = list()
+    for folder in folders:
+        if not os.path.isdir(folder):
+            print(f"Skipping {folder}: not a folder")
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.java'):
+                with open(os.path.join(folder, name), encoding='utf-8') as f:
+                    snippets.append((os.path.join(folder, name), f.read()))
+    return snippets
+
+
+def first_difference(expected: List[Tuple[str, str]], actual: List[Tuple[str, str]]) -> str:
+    for i, (e, a) in enumerate(zip(expected, actual)):
+        if e != a:
+            return f"token {i}: ANTLR {e}, regex {a}"
+    return f"ANTLR has {len(expected)} tokens, regex {len(actual)}"
+
+
+def timed(f: Callable, codes: List[str]) -> Tuple[List[List[Tuple[str, str]]], float]:
+    start = time.perf_counter()
+    results = list(map(f, codes))
+    return results, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that regex_tokenize produces the tokens of the ANTLR Java8Lexer on the snippets.")
+    parser.add_argument('folders', nargs='*', default=DEFAULT_FOLDERS)
+    parser.add_argument('--show', type=int, default=10, help='Snippets with differences to print')
+    args = parser.parse_args()
+
+    snippets = read_snippets(args.folders)
+    if not snippets:
+        print("No snippets found")
+        sys.exit(1)
+    codes = [code for _, code in snippets]
+
+    expected, antlr_time = timed(antlr_tokenize.tokenize, codes)
+    actual, regex_time = timed(regex_tokenize.tokenize, codes)
+
+    mismatches = [i for i, (e, a) in enumerate(zip(expected, actual)) if e != a]
+    for i in mismatches[:args.show]:
+        print(f"{snippets[i][0]}: {first_difference(expected[i], actual[i])}")
+    if mismatches:
+        # The token types whose counts differ, which shows whether the analyses are affected
+        counts = Counter()
+        for i in mismatches:
+            counts.update(t for t, _ in expected[i])
+            counts.subtract(t for t, _ in actual[i])
+        print(f"Token count differences: {dict((t, c) for t, c in counts.items() if c)}")
+
+    tokens = sum(map(len, expected))
+    print(f"{len(snippets)} snippets, {tokens} tokens: ANTLR {antlr_time:.2f} s, regex {regex_time:.2f} s, "
+          f"speedup {antlr_time / regex_time:.1f}x")
+    if mismatches:
+        print(f"{len(mismatches)} snippets differ from the ANTLR lexer")
+        sys.exit(1)
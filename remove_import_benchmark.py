@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, List, Tuple
+
+from java_import_util import remove_import
+
+DEFAULT_FOLDERS = ['./snippets/so/', './snippets-thalia/thalia-cs/']
+
+
+def remove_import_reference(lines: List[str]) -> Tuple[str, List[str]]:
+    """The previous remove_import, which concatenated the code line by line"""
+    new_str = ''
+    imports: List[str] = []
+    for line in lines:
+        if line.strip().startswith("import ") \
+                and ' ' not in line.strip()[6:].strip() \
+                and line.strip()[6:].endswith(';'):
+            imports.append(line.strip()[6:-1].strip())
+            continue
+        else:
+            new_str = new_str + line
+    return new_str.strip(), imports
+
+
+def read_snippets(folders: List[str]) -> List[List[str]]:
+    snippets = list()
+    for folder in folders:
+        if not os.path.isdir(folder):
+            print(f"Skipping {folder}: not a folder")
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.java'):
+                with open(os.path.join(folder, name), encoding='utf-8', errors='replace') as f:
+                    snippets.append(f.readlines())
+    return snippets
+
+
+def best_time(f: Callable, snippets: List[List[str]], repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for lines in snippets:
+            f(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare remove_import with the previous implementation on the snippets.")
+    parser.add_argument('folders', nargs='*', default=DEFAULT_FOLDERS)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs over all snippets; the best one counts')
+    parser.add_argument('--scale', type=int, default=1, help='Also time every snippet repeated this many times, to show the growth with length')
+    args = parser.parse_args()
+
+    snippets = read_snippets(args.folders)
+    if not snippets:
+        print("No snippets found")
+        sys.exit(1)
+
+    mismatches = [i for i, lines in enumerate(snippets) if remove_import(lines) != remove_import_reference(lines)]
+    if mismatches:
+        print(f"{len(mismatches)} snippets differ from the previous implementation, e.g. snippet {mismatches[0]}")
+        sys.exit(1)
+
+    for scale in sorted({1, args.scale}):
+        scaled = [lines * scale for lines in snippets]
+        reference = best_time(remove_import_reference, scaled, args.repeat)
+        current = best_time(remove_import, scaled, args.repeat)
+        print(f"{len(scaled)} snippets x{scale}: previous {reference * 1000:.1f} ms, "
+              f"current {current * 1000:.1f} ms, speedup {reference / current:.1f}x")
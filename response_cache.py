@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+import argparse
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# Set RESPONSE_CACHE_PATH to an empty string to disable the cache
+CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join(__location__, 'response-cache.sqlite'))
+CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(1 << 30)))
+
+
+def cache_key(model: str, messages: Any, options: Dict[str, Any], attempt: int = 0) -> str:
+    key = [model, messages, options]
+    # The first attempt keeps the key it had before retries were keyed
+    if attempt:
+        key.append(attempt)
+    data = json.dumps(key, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed store of model responses in a SQLite file.
+
+    Entries are keyed on the model name, the full prompt, the sampling
+    options and the attempt. Several processes can share one file; SQLite's
+    WAL mode and busy timeout serialize the writers. The size of the stored
+    responses is kept in the stats table, and once it exceeds max_bytes the
+    least recently used ones are evicted. Hit counts and last-used times are
+    kept in memory and written with the next put, by stats() and at exit.
+    """
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # Not yet written to the database: stats increments, and last_used by key
+        self.pending_counts: Dict[str, int] = dict()
+        self.pending_used: Dict[str, float] = dict()
+        with self.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, model TEXT, response TEXT, '
+                         'size INTEGER, created REAL, last_used REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+            conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+            # Summed once for a file written before the size was kept
+            if conn.execute("SELECT 1 FROM stats WHERE name = 'bytes'").fetchone() is None:
+                conn.execute("INSERT INTO stats SELECT 'bytes', COALESCE(SUM(size), 0) FROM responses")
+        atexit.register(self.flush)
+
+    def connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            if name == 'hits':
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.pending_counts[name] = self.pending_counts.get(name, 0) + 1
+
+    def take_pending(self):
+        with self.lock:
+            counts, self.pending_counts = self.pending_counts, dict()
+            used, self.pending_used = self.pending_used, dict()
+        return counts, used
+
+    def write_pending(self, conn: sqlite3.Connection, counts: Dict[str, int], used: Dict[str, float]) -> None:
+        conn.executemany('UPDATE stats SET value = value + ? WHERE name = ?',
+                         [(value, name) for name, value in counts.items()])
+        conn.executemany('UPDATE responses SET last_used = MAX(last_used, ?) WHERE key = ?',
+                         [(last_used, key) for key, last_used in used.items()])
+
+    def flush(self) -> None:
+        counts, used = self.take_pending()
+        if counts or used:
+            with self.connection() as conn:
+                self.write_pending(conn, counts, used)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.connection() as conn:
+            row = conn.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with self.lock:
+            self.pending_used[key] = time.time()
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, response: Any) -> None:
+        data = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        counts, used = self.take_pending()
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self.write_pending(conn, counts, used)
+            row = conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                         (key, model, data, len(data), now, now))
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'bytes'",
+                         (len(data) - (row[0] if row else 0),))
+            total = conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+        if total > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        with self.connection() as conn:
+            # Another process may be evicting too: read the size again under the write lock
+            conn.execute('BEGIN IMMEDIATE')
+            total = conn.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()[0]
+            evicted = list()
+            freed = 0
+            for key, size in conn.execute('SELECT key, size FROM responses ORDER BY last_used'):
+                if total - freed <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                freed += size
+            conn.executemany('DELETE FROM responses WHERE key = ?', evicted)
+            conn.execute("UPDATE stats SET value = value - ? WHERE name = 'bytes'", (freed,))
+
+    def clear(self) -> None:
+        with self.connection() as conn:
+            conn.execute('DELETE FROM responses')
+            conn.execute("UPDATE stats SET value = 0 WHERE name = 'bytes'")
+
+    def stats(self) -> Dict[str, int]:
+        self.flush()
+        with self.connection() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            totals = dict(conn.execute('SELECT name, value FROM stats').fetchall())
+        return {
+            'entries': entries,
+            'bytes': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'total_hits': totals.get('hits', 0),
+            'total_misses': totals.get('misses', 0),
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+_bypass = threading.local()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    global _cache
+    if not CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(CACHE_PATH)
+    return _cache
+
+
+@contextlib.contextmanager
+def bypass():
+    """Always call the model inside this block. Responses are still stored."""
+    _bypass.active = True
+    try:
+        yield
+    finally:
+        _bypass.active = False
+
+
+def cached(model: str, messages: Any, options: Dict[str, Any], f: Callable[[], Any],
+           store_if: Callable[[Any], bool] = bool, attempt: int = 0) -> Any:
+    """Return the stored response for (MODEL, MESSAGES, OPTIONS, ATTEMPT), or call F and store its result.
+    Results for which STORE_IF is false (by default, empty responses) are not stored.
+    A retry passes its attempt number, so it asks the model again instead of getting
+    the answer that failed, and a rerun replays the answer of each attempt."""
+    cache = get_cache()
+    if cache is None:
+        return f()
+    key = cache_key(model, messages, options, attempt)
+    if not getattr(_bypass, 'active', False):
+        response = cache.get(key)
+        if response is not None:
+            cache.count('hits')
+            return response
+    cache.count('misses')
+    response = f()
+    if store_if(response):
+        cache.put(key, model, response)
+    return response
+
+
+def print_stats() -> None:
+    cache = get_cache()
+    if cache is None:
+        print("Response cache disabled")
+        return
+    print(f"Response cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the model response cache.")
+    parser.add_argument('--clear', action='store_true', help='Delete all stored responses')
+    args = parser.parse_args()
+
+    if args.clear and get_cache() is not None:
+        get_cache().clear()
+    print_stats()
@@ -0,0 +1,159 @@
+import concurrent.futures
+import contextlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from build_manifest import digest_bytes, digest_file
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# Set CELL_CACHE_PATH to an empty string to compute every cell again
+CELL_CACHE_PATH = os.getenv('CELL_CACHE_PATH', os.path.join(__location__, 'summarize-output', 'cells.sqlite'))
+SUMMARIZE_JOBS = int(os.getenv('SUMMARIZE_JOBS', str(os.cpu_count() or 1)))
+
+
+def path_digest(path: Optional[str]) -> Optional[str]:
+    """Digest of a file, or of the names and contents of the files in a folder"""
+    if path is None or not os.path.exists(path):
+        return None
+    if os.path.isfile(path):
+        return digest_file(path)
+    entries = [f'{name}:{digest_file(os.path.join(path, name))}'
+               for name in sorted(os.listdir(path)) if os.path.isfile(os.path.join(path, name))]
+    return digest_bytes('\n'.join(entries).encode('utf-8'))
+
+
+def code_digest() -> str:
+    """Digest of the loaded modules of this repository, so a cell is computed again after its code changed"""
+    files = set()
+    for module in list(sys.modules.values()):
+        file = getattr(module, '__file__', None)
+        if file and os.path.dirname(os.path.realpath(file)) == __location__ and module.__name__ != '__main__':
+            files.add(os.path.realpath(file))
+    return digest_bytes('\n'.join(f'{os.path.basename(f)}:{digest_file(f)}' for f in sorted(files)).encode('utf-8'))
+
+
+def run_quietly(f: Callable, args: List[Any]) -> Any:
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return f(*args)
+
+
+class Cell:
+    """The result of one task, computed in the pool or read from the store"""
+
+    def __init__(self, cells: 'Cells', key: str, future: Optional[concurrent.futures.Future] = None, value: Any = None):
+        self.cells = cells
+        self.key = key
+        self.future = future
+        self.value = value
+        # Read by the tasks that take this cell as an argument, from their own threads
+        self.lock = threading.Lock()
+
+    def result(self) -> Any:
+        with self.lock:
+            if self.future is not None:
+                # Returned as stored, so a computed and a stored result look the same
+                self.value = json.loads(json.dumps(self.future.result()))
+                self.cells.put(self.key, self.value)
+                self.future = None
+            return self.value
+
+
+class Cells:
+    """Memoized analysis results for the tables of summarize_table.py.
+
+    A task is a module level function with its arguments. Its key is the
+    function, the arguments, the content digest of the files and folders it
+    reads, and the digest of the repository's code. Files and folders are
+    digested once per run. Tasks that are not stored run on a process pool
+    with their output silenced. A task can take the cells of other tasks as
+    arguments; submitting it does not wait for them, it starts once they are
+    done. Results must be JSON values other than null.
+    """
+
+    def __init__(self, path: str = CELL_CACHE_PATH, jobs: int = SUMMARIZE_JOBS):
+        self.path = path
+        self.jobs = jobs
+        self.local = threading.local()
+        self.executor = None
+        # Waits for the cells a task takes before it goes to the process pool
+        self.waiter = None
+        self.code = None
+        self.digests: Dict[str, Optional[str]] = dict()
+        self.computed = 0
+        self.reused = 0
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with self.connection() as conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS cells (key TEXT PRIMARY KEY, value TEXT)')
+
+    def connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        if not self.path:
+            return None
+        with self.connection() as conn:
+            row = conn.execute('SELECT value FROM cells WHERE key = ?', (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        if self.path:
+            with self.connection() as conn:
+                conn.execute('INSERT OR REPLACE INTO cells VALUES (?, ?)', (key, json.dumps(value)))
+
+    def key(self, f: Callable, args: List[Any], paths: Iterable[Optional[str]]) -> str:
+        if self.code is None:
+            self.code = code_digest()
+        args = [{'cell': a.key} if isinstance(a, Cell) else a for a in args]
+        data = json.dumps([f.__module__, f.__qualname__, args, [self.path_digest(p) for p in paths], self.code],
+                          sort_keys=True, default=str)
+        return digest_bytes(data.encode('utf-8'))
+
+    def path_digest(self, path: Optional[str]) -> Optional[str]:
+        # The inputs of the tables do not change while they are summarized
+        if path not in self.digests:
+            self.digests[path] = path_digest(path)
+        return self.digests[path]
+
+    def run(self, f: Callable, args: List[Any]) -> Any:
+        args = [a.result() if isinstance(a, Cell) else a for a in args]
+        return self.executor.submit(run_quietly, f, args).result()
+
+    def submit(self, f: Callable, *args, paths: Iterable[Optional[str]] = ()) -> Cell:
+        """A cell for F(*ARGS). PATHS are the files and folders F reads."""
+        key = self.key(f, list(args), paths)
+        value = self.get(key)
+        if value is not None:
+            self.reused += 1
+            return Cell(self, key, value=value)
+        self.computed += 1
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+        if not any(isinstance(a, Cell) and a.future is not None for a in args):
+            args = [a.result() if isinstance(a, Cell) else a for a in args]
+            return Cell(self, key, future=self.executor.submit(run_quietly, f, args))
+        if self.waiter is None:
+            # Tasks wait in submission order, so a waiting task only ever waits on earlier ones
+            self.waiter = concurrent.futures.ThreadPoolExecutor()
+        return Cell(self, key, future=self.waiter.submit(self.run, f, list(args)))
+
+    def close(self) -> None:
+        if self.waiter is not None:
+            self.waiter.shutdown()
+            self.waiter = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        print(f"Result cells: {self.computed} computed, {self.reused} reused")
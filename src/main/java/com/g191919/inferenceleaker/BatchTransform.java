@@ -0,0 +1,150 @@
+package com.g191919.inferenceleaker;
+
+import com.google.gson.Gson;
+
+import java.io.*;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.*;
+import java.util.function.UnaryOperator;
+
+/**
+ * Runs transformations over many files in a single JVM.
+ * Usage: java BatchTransform [--json] <stage>[,<stage>...] [manifest]
+ * A stage is a transformation name, optionally suffixed with ":numbered" to use numbered instead of random names.
+ * Stages are applied in order, in memory.
+ * <p>
+ * By default each manifest line (read from stdin if no file is given) is "<input path>\t<output path>" and the
+ * result of the last stage is written to the output path.
+ * With --json each line is {"id": ..., "code": ...} and the result of every stage is sent back instead.
+ * For every line one JSON status is printed on stdout; the transformations' own logging is discarded.
+ */
+public class BatchTransform {
+    public static final Map<String, UnaryOperator<String>> TRANSFORMS = Map.of(
+            "Lowering", Lowering::lower,
+            "RenameVariables", RenameVariables::renameVariables,
+            "RemoveComments", RemoveComments::removeComments,
+            "ReorderClass", ReorderClass::reorderClass,
+            "AddFileTypes", AddFileTypes::addType,
+            "AddMoreTypes", AddMoreTypes::addType,
+            "ExtractNames", ExtractNames::extractName,
+            "ExtractImport", source -> new ExtractImport().processSource(source)
+    );
+
+    public record Stage(String name, UnaryOperator<String> transform, boolean numberedNames) {
+        public String apply(String sourceCode) {
+            // Every stage starts from the same state as a fresh JVM would
+            boolean defaultNumberedNames = Utils.NUMBERED_NAMES;
+            Utils.NUMBERED_NAMES = numberedNames || defaultNumberedNames;
+            Utils.randomNamesHistory.clear();
+            try {
+                return transform.apply(sourceCode);
+            } finally {
+                Utils.NUMBERED_NAMES = defaultNumberedNames;
+            }
+        }
+    }
+
+    public record Status(String input, String output, String status, String message) {
+    }
+
+    public record CodeRequest(String id, String code) {
+    }
+
+    public record CodeStatus(String id, String status, List<String> stages, String message) {
+    }
+
+    public static List<Stage> parseStages(String spec) {
+        List<Stage> stages = new ArrayList<>();
+        for (String stageSpec : spec.split(",")) {
+            String[] parts = stageSpec.split(":");
+            UnaryOperator<String> transform = TRANSFORMS.get(parts[0]);
+            if (transform == null || parts.length > 2 || (parts.length == 2 && !parts[1].equals("numbered"))) {
+                throw new IllegalArgumentException("Unknown stage: " + stageSpec);
+            }
+            stages.add(new Stage(stageSpec, transform, parts.length == 2));
+        }
+        return stages;
+    }
+
+    public static void main(String[] args) throws IOException {
+        List<String> arguments = new ArrayList<>(Arrays.asList(args));
+        boolean json = arguments.remove("--json");
+        List<Stage> stages = null;
+        if (!arguments.isEmpty() && arguments.size() <= 2) {
+            try {
+                stages = parseStages(arguments.get(0));
+            } catch (IllegalArgumentException e) {
+                System.err.println(e.getMessage());
+            }
+        }
+        if (stages == null) {
+            System.err.println("Usage: java BatchTransform [--json] <stage>[,<stage>...] [manifest]");
+            System.err.println("Stages: " + String.join(", ", new TreeSet<>(TRANSFORMS.keySet())) + ", each optionally with :numbered");
+            System.exit(1);
+        }
+        InputStream manifest = arguments.size() == 2 ? Files.newInputStream(Paths.get(arguments.get(1))) : System.in;
+        PrintStream statusOut = System.out;
+        Gson gson = new Gson();
+        try (BufferedReader reader = new BufferedReader(new InputStreamReader(manifest, StandardCharsets.UTF_8))) {
+            System.setOut(new PrintStream(OutputStream.nullOutputStream()));
+            String line;
+            while ((line = reader.readLine()) != null) {
+                if (line.isBlank()) {
+                    continue;
+                }
+                if (json) {
+                    statusOut.println(gson.toJson(transform(stages, gson.fromJson(line, CodeRequest.class))));
+                    continue;
+                }
+                String[] paths = line.split("\t");
+                if (paths.length != 2) {
+                    statusOut.println(gson.toJson(new Status(line, null, "error", "Expected <input>\\t<output>")));
+                    continue;
+                }
+                statusOut.println(gson.toJson(transform(stages, Paths.get(paths[0]), Paths.get(paths[1]))));
+            }
+        } finally {
+            System.setOut(statusOut);
+        }
+    }
+
+    public static List<String> applyAll(List<Stage> stages, String sourceCode) {
+        List<String> results = new ArrayList<>();
+        for (Stage stage : stages) {
+            sourceCode = stage.apply(sourceCode);
+            results.add(sourceCode);
+        }
+        return results;
+    }
+
+    public static Status transform(List<Stage> stages, Path inputPath, Path outputPath) {
+        if (Files.exists(outputPath)) {
+            return new Status(inputPath.toString(), outputPath.toString(), "exists", "Output file already exists: " + outputPath);
+        }
+        try {
+            String sourceCode = new String(Files.readAllBytes(inputPath));
+            List<String> results = applyAll(stages, sourceCode);
+            Files.writeString(outputPath, results.get(results.size() - 1));
+            return new Status(inputPath.toString(), outputPath.toString(), "ok", null);
+        } catch (Exception | StackOverflowError e) {
+            return new Status(inputPath.toString(), outputPath.toString(), "error", stackTrace(e));
+        }
+    }
+
+    public static CodeStatus transform(List<Stage> stages, CodeRequest request) {
+        try {
+            return new CodeStatus(request.id(), "ok", applyAll(stages, request.code()), null);
+        } catch (Exception | StackOverflowError e) {
+            return new CodeStatus(request.id(), "error", null, stackTrace(e));
+        }
+    }
+
+    private static String stackTrace(Throwable e) {
+        StringWriter stackTrace = new StringWriter();
+        e.printStackTrace(new PrintWriter(stackTrace));
+        return stackTrace.toString();
+    }
+}
@@ -0,0 +1,220 @@
+package com.g191919.inferenceleaker;
+
+import com.google.gson.Gson;
+
+import java.io.*;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.MalformedURLException;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.List;
+
+/**
+ * Keeps one JVM warm across many SnR runs.
+ * Reads one JSON request per line ({"id": ..., "code": ...}), runs the SnR builder's main with the code
+ * as stdin and answers with one JSON line holding its exit code, stdout and stderr.
+ * Serves stdin/stdout by default, or a TCP port if one is given.
+ * With the system property snr.classpath, the builder is loaded from that class path in a new class loader
+ * for every request, so static state of the builder does not carry over from one snippet to the next.
+ */
+public class SnRWorker {
+    public static final String DEFAULT_BUILDER = "org.javelus.snr.compile.SnRBuilder";
+
+    public record Request(String id, String code) {
+    }
+
+    public record Response(String id, int exitCode, String stdout, String stderr) {
+    }
+
+    static class ExitTrappedException extends SecurityException {
+        final int status;
+
+        ExitTrappedException(int status) {
+            super("System.exit(" + status + ") trapped");
+            this.status = status;
+        }
+    }
+
+    private final Method builderMain;
+    private final String builderName;
+    private final URL[] builderClasspath;
+    private final Gson gson = new Gson();
+    private volatile boolean running = false;
+
+    /**
+     * Runs BUILDER_MAIN for every request.
+     */
+    public SnRWorker(Method builderMain) {
+        this.builderMain = builderMain;
+        this.builderName = null;
+        this.builderClasspath = null;
+        trapExit();
+    }
+
+    /**
+     * Loads BUILDER_NAME from BUILDER_CLASSPATH in a new class loader for every request.
+     */
+    public SnRWorker(String builderName, URL[] builderClasspath) {
+        this.builderMain = null;
+        this.builderName = builderName;
+        this.builderClasspath = builderClasspath;
+        trapExit();
+    }
+
+    public static void main(String[] args) throws Exception {
+        String builderName = System.getProperty("snr.builder", DEFAULT_BUILDER);
+        String builderClasspath = System.getProperty("snr.classpath");
+        SnRWorker worker = builderClasspath == null
+                ? new SnRWorker(Class.forName(builderName).getMethod("main", String[].class))
+                : new SnRWorker(builderName, parseClasspath(builderClasspath));
+        if (args.length == 0) {
+            // Only responses go to stdout; anything else printed outside a request goes to stderr
+            PrintStream responses = System.out;
+            System.setOut(System.err);
+            worker.serve(System.in, responses);
+            return;
+        }
+        try (ServerSocket serverSocket = new ServerSocket(Integer.parseInt(args[0]))) {
+            System.err.println("SnRWorker listening on port " + serverSocket.getLocalPort());
+            worker.listen(serverSocket);
+        }
+    }
+
+    /**
+     * The URLs of a class path, where an entry ending in * stands for the jars of its folder as for java -cp.
+     */
+    static URL[] parseClasspath(String classpath) throws MalformedURLException {
+        List<URL> urls = new ArrayList<>();
+        for (String entry : classpath.split(File.pathSeparator)) {
+            if (entry.isEmpty()) {
+                continue;
+            }
+            if (entry.endsWith("*")) {
+                File[] jars = new File(entry.substring(0, entry.length() - 1)).listFiles(
+                        (dir, name) -> name.toLowerCase().endsWith(".jar"));
+                if (jars != null) {
+                    Arrays.sort(jars);
+                    for (File jar : jars) {
+                        urls.add(jar.toURI().toURL());
+                    }
+                }
+            } else {
+                urls.add(new File(entry).toURI().toURL());
+            }
+        }
+        return urls.toArray(new URL[0]);
+    }
+
+    /**
+     * Serves every accepted connection on its own thread, so that several clients can stay connected.
+     * Requests still run one at a time.
+     */
+    public void listen(ServerSocket serverSocket) throws IOException {
+        while (true) {
+            Socket socket = serverSocket.accept();
+            Thread thread = new Thread(() -> {
+                try (socket) {
+                    serve(socket.getInputStream(), socket.getOutputStream());
+                } catch (IOException e) {
+                    e.printStackTrace();
+                }
+            }, "SnRWorker-" + socket.getRemoteSocketAddress());
+            thread.setDaemon(true);
+            thread.start();
+        }
+    }
+
+    @SuppressWarnings("removal")
+    private void trapExit() {
+        // The builder may call System.exit once it is done; that must not take the worker down.
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkPermission(Permission perm) {
+                }
+
+                @Override
+                public void checkExit(int status) {
+                    if (running) {
+                        throw new ExitTrappedException(status);
+                    }
+                }
+            });
+        } catch (UnsupportedOperationException e) {
+            System.err.println("Cannot trap System.exit, the worker exits with the builder: " + e.getMessage());
+        }
+    }
+
+    public void serve(InputStream in, OutputStream out) throws IOException {
+        BufferedReader reader = new BufferedReader(new InputStreamReader(in, StandardCharsets.UTF_8));
+        PrintStream writer = new PrintStream(out, true, StandardCharsets.UTF_8);
+        String line;
+        while ((line = reader.readLine()) != null) {
+            if (line.isBlank()) {
+                continue;
+            }
+            Request request = gson.fromJson(line, Request.class);
+            writer.println(gson.toJson(handle(request)));
+        }
+    }
+
+    public synchronized Response handle(Request request) {
+        InputStream oldIn = System.in;
+        PrintStream oldOut = System.out;
+        PrintStream oldErr = System.err;
+        ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+        ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+        int exitCode = 0;
+        Thread thread = Thread.currentThread();
+        ClassLoader oldContextLoader = thread.getContextClassLoader();
+        URLClassLoader loader = null;
+        try {
+            System.setIn(new ByteArrayInputStream(request.code().getBytes(StandardCharsets.UTF_8)));
+            System.setOut(new PrintStream(stdout, true, StandardCharsets.UTF_8));
+            System.setErr(new PrintStream(stderr, true, StandardCharsets.UTF_8));
+            running = true;
+            Method main = builderMain;
+            if (main == null) {
+                loader = new URLClassLoader(builderClasspath, ClassLoader.getPlatformClassLoader());
+                thread.setContextClassLoader(loader);
+                main = Class.forName(builderName, true, loader).getMethod("main", String[].class);
+            }
+            main.invoke(null, (Object) new String[0]);
+        } catch (InvocationTargetException e) {
+            Throwable cause = e.getCause();
+            if (cause instanceof ExitTrappedException exit) {
+                exitCode = exit.status;
+            } else {
+                cause.printStackTrace();
+                exitCode = 1;
+            }
+        } catch (ReflectiveOperationException | LinkageError e) {
+            e.printStackTrace();
+            exitCode = 1;
+        } finally {
+            running = false;
+            thread.setContextClassLoader(oldContextLoader);
+            if (loader != null) {
+                try {
+                    loader.close();
+                } catch (IOException e) {
+                    e.printStackTrace();
+                }
+            }
+            System.out.flush();
+            System.err.flush();
+            System.setIn(oldIn);
+            System.setOut(oldOut);
+            System.setErr(oldErr);
+        }
+        return new Response(request.id(), exitCode,
+                stdout.toString(StandardCharsets.UTF_8), stderr.toString(StandardCharsets.UTF_8));
+    }
+}
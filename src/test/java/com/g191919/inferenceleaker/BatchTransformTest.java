@@ -0,0 +1,77 @@
+package com.g191919.inferenceleaker;
+
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.IOException;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.util.List;
+
+import static org.junit.jupiter.api.Assertions.*;
+
+class BatchTransformTest {
+
+    @TempDir
+    Path tempDir;
+
+    @Test
+    void transform() throws IOException {
+        Path input = tempDir.resolve("Input.java");
+        Path output = tempDir.resolve("Output.java");
+        Files.writeString(input, """
+                public class HelloWorld {
+                    // comment
+                    int a;
+                }""");
+
+        BatchTransform.Status status = BatchTransform.transform(BatchTransform.parseStages("RemoveComments"), input, output);
+        assertEquals("ok", status.status());
+        assertEquals("""
+                public class HelloWorld {
+                
+                    int a;
+                }""", Files.readString(output));
+
+        status = BatchTransform.transform(BatchTransform.parseStages("RemoveComments"), input, output);
+        assertEquals("exists", status.status());
+    }
+
+    @Test
+    void transformMissingInput() {
+        BatchTransform.Status status = BatchTransform.transform(BatchTransform.parseStages("RemoveComments"),
+                tempDir.resolve("Missing.java"), tempDir.resolve("Output.java"));
+        assertEquals("error", status.status());
+        assertNotNull(status.message());
+        assertFalse(Files.exists(tempDir.resolve("Output.java")));
+    }
+
+    @Test
+    void parseStages() {
+        List<BatchTransform.Stage> stages = BatchTransform.parseStages("Lowering:numbered,RenameVariables");
+        assertEquals(2, stages.size());
+        assertTrue(stages.get(0).numberedNames());
+        assertFalse(stages.get(1).numberedNames());
+        assertThrows(IllegalArgumentException.class, () -> BatchTransform.parseStages("Lowering:random"));
+        assertThrows(IllegalArgumentException.class, () -> BatchTransform.parseStages("Unknown"));
+    }
+
+    @Test
+    void transformCode() {
+        String sourceCode = """
+                public class A {
+                    // comment
+                    void f() {
+                        int x = 1;
+                    }
+                }""";
+        BatchTransform.CodeStatus status = BatchTransform.transform(
+                BatchTransform.parseStages("RemoveComments,RenameVariables"), new BatchTransform.CodeRequest("a", sourceCode));
+        assertEquals("a", status.id());
+        assertEquals("ok", status.status());
+        assertEquals(2, status.stages().size());
+        assertEquals(RemoveComments.removeComments(sourceCode), status.stages().get(0));
+        Utils.randomNamesHistory.clear();
+        assertEquals(RenameVariables.renameVariables(status.stages().get(0)), status.stages().get(1));
+    }
+}
@@ -0,0 +1,132 @@
+package com.g191919.inferenceleaker;
+
+import org.junit.jupiter.api.Test;
+import org.junit.jupiter.api.io.TempDir;
+
+import java.io.BufferedReader;
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.net.URL;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+
+import static org.junit.jupiter.api.Assertions.*;
+
+class SnRWorkerTest {
+
+    public static class EchoBuilder {
+        public static void main(String[] args) throws IOException {
+            String code = new String(System.in.readAllBytes(), StandardCharsets.UTF_8);
+            System.err.println("building");
+            System.out.print("{\"updatedContent\": \"" + code.length() + "\"}");
+        }
+    }
+
+    public static class CountingBuilder {
+        static int runs = 0;
+
+        public static void main(String[] args) {
+            runs++;
+            System.out.print(runs);
+        }
+    }
+
+    public static class FailingBuilder {
+        public static void main(String[] args) {
+            throw new IllegalStateException("broken");
+        }
+    }
+
+    @Test
+    void handle() throws Exception {
+        SnRWorker worker = new SnRWorker(EchoBuilder.class.getMethod("main", String[].class));
+        SnRWorker.Response response = worker.handle(new SnRWorker.Request("1", "class A {}"));
+        assertEquals("1", response.id());
+        assertEquals(0, response.exitCode());
+        assertEquals("{\"updatedContent\": \"10\"}", response.stdout());
+        assertEquals("building\n", response.stderr().replace("\r\n", "\n"));
+    }
+
+    @Test
+    void handleFailure() throws Exception {
+        SnRWorker worker = new SnRWorker(FailingBuilder.class.getMethod("main", String[].class));
+        SnRWorker.Response response = worker.handle(new SnRWorker.Request("2", ""));
+        assertEquals(1, response.exitCode());
+        assertTrue(response.stderr().contains("broken"));
+    }
+
+    @Test
+    void handleResetsStaticStateWithBuilderClasspath() throws Exception {
+        URL classes = CountingBuilder.class.getProtectionDomain().getCodeSource().getLocation();
+        SnRWorker worker = new SnRWorker(CountingBuilder.class.getName(), new URL[]{classes});
+        assertEquals("1", worker.handle(new SnRWorker.Request("1", "")).stdout());
+        assertEquals("1", worker.handle(new SnRWorker.Request("2", "")).stdout());
+
+        SnRWorker shared = new SnRWorker(CountingBuilder.class.getMethod("main", String[].class));
+        shared.handle(new SnRWorker.Request("3", ""));
+        assertNotEquals("1", shared.handle(new SnRWorker.Request("4", "")).stdout());
+    }
+
+    @Test
+    void parseClasspath(@TempDir Path dir) throws Exception {
+        Files.createFile(dir.resolve("b.jar"));
+        Files.createFile(dir.resolve("a.jar"));
+        Files.createFile(dir.resolve("notes.txt"));
+        URL[] urls = SnRWorker.parseClasspath("classes" + File.pathSeparator + dir + File.separator + "*");
+        assertEquals(3, urls.length);
+        assertTrue(urls[0].toString().endsWith("/classes"));
+        assertTrue(urls[1].toString().endsWith("/a.jar"));
+        assertTrue(urls[2].toString().endsWith("/b.jar"));
+    }
+
+    @Test
+    void serve() throws Exception {
+        SnRWorker worker = new SnRWorker(EchoBuilder.class.getMethod("main", String[].class));
+        String requests = "{\"id\": \"a\", \"code\": \"x\\ny\"}\n\n{\"id\": \"b\", \"code\": \"\"}\n";
+        ByteArrayOutputStream out = new ByteArrayOutputStream();
+        worker.serve(new ByteArrayInputStream(requests.getBytes(StandardCharsets.UTF_8)), out);
+        String[] lines = out.toString(StandardCharsets.UTF_8).strip().split("\n");
+        assertEquals(2, lines.length);
+        assertTrue(lines[0].contains("\"id\":\"a\""));
+        assertTrue(lines[0].contains("\\\"3\\\""));
+        assertTrue(lines[1].contains("\"id\":\"b\""));
+    }
+
+    @Test
+    void listenServesConnectionsConcurrently() throws Exception {
+        SnRWorker worker = new SnRWorker(EchoBuilder.class.getMethod("main", String[].class));
+        try (ServerSocket serverSocket = new ServerSocket(0)) {
+            Thread server = new Thread(() -> {
+                try {
+                    worker.listen(serverSocket);
+                } catch (IOException e) {
+                    // Closed at the end of the test
+                }
+            });
+            server.setDaemon(true);
+            server.start();
+            try (Socket first = new Socket("localhost", serverSocket.getLocalPort());
+                 Socket second = new Socket("localhost", serverSocket.getLocalPort())) {
+                first.setSoTimeout(10000);
+                second.setSoTimeout(10000);
+                // The first connection stays open while the second one is answered
+                assertTrue(request(second, "b").contains("\"id\":\"b\""));
+                assertTrue(request(first, "a").contains("\"id\":\"a\""));
+            }
+        }
+    }
+
+    private static String request(Socket socket, String id) throws IOException {
+        PrintStream writer = new PrintStream(socket.getOutputStream(), true, StandardCharsets.UTF_8);
+        writer.println("{\"id\": \"" + id + "\", \"code\": \"x\"}");
+        BufferedReader reader = new BufferedReader(new InputStreamReader(socket.getInputStream(), StandardCharsets.UTF_8));
+        return reader.readLine();
+    }
+}
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict
+
+__location__ = os.path.realpath(
+    os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+# Modules run as command line tools, or started by Perses for every candidate
+ENTRY_POINTS = [
+    'check_expected_imports',
+    'infer_repl',
+    'property_server',
+    'r_property_check',
+    'reduction',
+    'infer_snr',
+    'tokenize_llm',
+]
+BASELINE_PATH = os.path.join(__location__, 'startup_baseline.json')
+
+
+def import_time(module: str, runs: int = 5) -> float:
+    """Best cumulative import time of MODULE in milliseconds, measured with python -X importtime."""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=__location__, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Cannot import {module}:\n{result.stderr}")
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            parts = line.split('|')
+            if len(parts) == 3 and parts[2].strip() == module and not parts[2].startswith('  '):
+                cumulative = int(parts[1]) / 1000
+                best = cumulative if best is None else min(best, cumulative)
+    return best
+
+
+def measure(modules, runs) -> Dict[str, float]:
+    return {module: import_time(module, runs) for module in modules}
+
+
+def check(times: Dict[str, float], baseline: Dict[str, float], tolerance: float, slack: float) -> bool:
+    ok = True
+    for module, ms in times.items():
+        allowed = baseline.get(module)
+        if allowed is None:
+            print(f"{module:25} {ms:8.1f} ms  (no baseline)")
+            continue
+        allowed = allowed * tolerance + slack
+        status = 'ok' if ms <= allowed else 'REGRESSION'
+        ok = ok and ms <= allowed
+        print(f"{module:25} {ms:8.1f} ms  (allowed {allowed:.1f} ms) {status}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the entry points still import quickly.")
+    parser.add_argument('modules', nargs='*', default=ENTRY_POINTS)
+    parser.add_argument('--runs', type=int, default=5, help='Measurements per module; the best one counts')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='Allowed factor over the baseline')
+    parser.add_argument('--slack', type=float, default=20.0, help='Allowed milliseconds over the baseline')
+    parser.add_argument('--update', action='store_true', help=f'Record the current times in {os.path.basename(BASELINE_PATH)}')
+    args = parser.parse_args()
+
+    times = measure(args.modules, args.runs)
+    if args.update:
+        baseline = dict()
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as f:
+                baseline = json.load(f)
+        baseline.update({module: round(ms, 1) for module, ms in times.items()})
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(json.dumps(baseline, indent=2, sort_keys=True))
+        sys.exit(0)
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    sys.exit(0 if check(times, baseline, args.tolerance, args.slack) else 1)
@@ -1,8 +1,7 @@
 #!/usr/bin/env python
 
 import os
-import sys
-from typing import List, Any, Dict, Union
+from typing import List, Any, Dict, Tuple, Union
 
 from analyze_result_by_popularity import filtered_result, get_recalls_by_popularity
 from analyze_simple_name_stattypeso import get_recalls
@@ -11,9 +10,12 @@ from analyze_token_dist_reduction import scatter_box_plot_array, count_simplenam
     ratio_of_reduction
 from compare_results import process_files_precision_recall
 from tokenize_llm import get_decoder
+from result_cells import Cells
 
 constants = dict()
 constants_f = list()
+# Results of the analyses, computed on a process pool and remembered across runs
+cells = Cells()
 
 def generate_latex_command_dict(name_to_val: Dict[str, str]):
     commands = list()
@@ -154,43 +156,47 @@ def significance_stars(p: int) -> str:
         return ''
 
 def create_rows_compare(prefixes: List[str], postfixes: List[str], row_labels: List[str], input_folder: str, output_folder: str, comparison=True, add_mid_second=True) -> List[List[str]]:
-    rows: List[List[str]] = list()
+    # Start every cell of the table first, so they are computed in parallel
+    table_cells: Dict[Tuple[int, str], Any] = dict()
     for i, postfix in enumerate(postfixes):
-        row: List[str] = list()
         for _, prefix in enumerate(prefixes):
             input_folder_path = os.path.join(input_folder, postfix)
             model_comparison_folder = os.path.join(output_folder, f'{prefix}-output-{postfixes[0]}')
             output_folder_path = os.path.join(output_folder, f'{prefix}-output-{postfix}')
             if not os.path.exists(output_folder_path) or not os.listdir(output_folder_path):
                 print(f'Output folder not found {output_folder_path}')
-                row.append('-')
                 continue
             if not os.path.isdir(model_comparison_folder) or model_comparison_folder == output_folder_path:
                 model_comparison_folder = None
             if not comparison:
                 model_comparison_folder = None
             print(f'process_files({input_folder_path, output_folder_path, model_comparison_folder})')
-            with open(os.devnull, 'w') as devnull:
-                old_stdout = sys.stdout  # Save the current standard output
-                sys.stdout = devnull     # Redirect standard output to devnull
-                correct, recommended, expected, precision_s, recall_s, f1_s = process_files_precision_recall(input_folder_path, output_folder_path, comparison_folder=model_comparison_folder)
-                sys.stdout = old_stdout  # Restore standard output after function execution
-                print(f'Called process_files_precision_recall({input_folder_path}, {output_folder_path}, comparison_folder={model_comparison_folder})')
-                sig_stars = significance_stars(precision_s)
-                if len(sig_stars) < 3 and comparison:
-                    sig_stars += '\\phantom{' + ('*'* (3 - len(sig_stars))) + '}'
-                precision = correct/recommended
-                row.append(f'{precision*100:.2f}%{sig_stars}')
-                sig_stars = significance_stars(recall_s)
-                if len(sig_stars) < 3 and comparison:
-                    sig_stars += '\\phantom{' + ('*'* (3 - len(sig_stars))) + '}'
-                recall = correct/expected
-                row.append(f'{recall*100:.2f}%{sig_stars}')
-                sig_stars = significance_stars(f1_s)
-                if len(sig_stars) < 3 and comparison:
-                    sig_stars += '\\phantom{' + ('*'* (3 - len(sig_stars))) + '}'
-                f1 = (2 * precision * recall) / (precision + recall)
-                row.append(f'{f1*100:.2f}%{sig_stars}')
+            table_cells[(i, prefix)] = cells.submit(process_files_precision_recall, input_folder_path, output_folder_path, model_comparison_folder,
+                                                    paths=[input_folder_path, output_folder_path, model_comparison_folder])
+
+    rows: List[List[str]] = list()
+    for i, postfix in enumerate(postfixes):
+        row: List[str] = list()
+        for _, prefix in enumerate(prefixes):
+            if (i, prefix) not in table_cells:
+                row.append('-')
+                continue
+            correct, recommended, expected, precision_s, recall_s, f1_s = table_cells[(i, prefix)].result()
+            sig_stars = significance_stars(precision_s)
+            if len(sig_stars) < 3 and comparison:
+                sig_stars += '\\phantom{' + ('*'* (3 - len(sig_stars))) + '}'
+            precision = correct/recommended
+            row.append(f'{precision*100:.2f}%{sig_stars}')
+            sig_stars = significance_stars(recall_s)
+            if len(sig_stars) < 3 and comparison:
+                sig_stars += '\\phantom{' + ('*'* (3 - len(sig_stars))) + '}'
+            recall = correct/expected
+            row.append(f'{recall*100:.2f}%{sig_stars}')
+            sig_stars = significance_stars(f1_s)
+            if len(sig_stars) < 3 and comparison:
+                sig_stars += '\\phantom{' + ('*'* (3 - len(sig_stars))) + '}'
+            f1 = (2 * precision * recall) / (precision + recall)
+            row.append(f'{f1*100:.2f}%{sig_stars}')
         rows.append([row_labels[i], *row])
         if i == 0 and add_mid_second:
             rows.append('\\midrule')
@@ -416,15 +422,23 @@ def create_table_by_boa_rare() -> None:
         rows = [[r'\multicolumn{2}{l}{Popularity}', *bin_names],
                 r'\midrule']
         boa_result_path = 'boa-output/all_fqn_count_out.txt'
-        for input_folder, output_folder, dataset_name in zip(['snippets/so', 'snippets-thalia/thalia-cs'], ['outputs', 'outputs-thalia'], ['\\stattypeso', '\\thaliacs']):
+        tools = ['snr', 'llama3.1-8b', 'llama3.1-70b', 'gpt-4o-mini', 'gpt-4o']
+        datasets = list(zip(['snippets/so', 'snippets-thalia/thalia-cs'], ['outputs', 'outputs-thalia'], ['\\stattypeso', '\\thaliacs']))
+        recall_cells = dict()
+        for input_folder, output_folder, _ in datasets:
             base_name = os.path.basename(os.path.normpath(input_folder))
+            popularity_map = cells.submit(filtered_result, boa_result_path, input_folder, paths=[boa_result_path, input_folder])
+            for tool in tools:
+                fixed_folder = os.path.join(output_folder, f'{tool}-output-{base_name}')
+                recall_cells[(input_folder, tool)] = cells.submit(get_recalls_by_popularity, input_folder, fixed_folder, popularity_map, bins,
+                                                                  paths=[input_folder, fixed_folder])
+
+        for input_folder, output_folder, dataset_name in datasets:
             unique_count = [r'\multirow{7}{*}{\rotatebox[origin=c]{90}{' + dataset_name + '}}', r'Total FQNs']
 
-            popularity_map = filtered_result(boa_result_path, input_folder)
-            for tool, tool_name in zip(['snr', 'llama3.1-8b', 'llama3.1-70b', 'gpt-4o-mini', 'gpt-4o'],
+            for tool, tool_name in zip(tools,
                             ['\\snr', '\\llamas', '\\llamam', '\\gptfomini', '\\gptfo']):
-                fixed_folder = os.path.join(output_folder, f'{tool}-output-{base_name}')
-                results = get_recalls_by_popularity(input_folder, fixed_folder, popularity_map, bins=bins)
+                results = recall_cells[(input_folder, tool)].result()
                 row = ['', tool_name]
 
                 for name, correct, expected, rare_fqns in results:
@@ -571,10 +585,13 @@ def create_reduction_token():
     write_latex_to_file(array_to_latex_table(rows, 'lrrrlrrr'), 'summarize-output', 'reduction-ratios.tex')
 
 if __name__ == "__main__":
-    create_table_generated()
-    create_table_transformations()
-    create_table_by_boa_rare()
-    create_scatter_box_reduction_ratio()
-    create_general_reduction()
-    create_reduction_token()
-    create_constants()
+    try:
+        create_table_generated()
+        create_table_transformations()
+        create_table_by_boa_rare()
+        create_scatter_box_reduction_ratio()
+        create_general_reduction()
+        create_reduction_token()
+        create_constants()
+    finally:
+        cells.close()
@@ -1,12 +1,33 @@
-import llama_models.llama3.api
-import tiktoken
-from importlib import resources
+import concurrent.futures
+import functools
+import operator
+import os
+import threading
 from abc import ABC, abstractmethod
-from typing import List, Any
+from typing import Dict, List, Any, Tuple
 
-from antlr_tokenize import tokenize as java_tokenize
+# tiktoken, llama_models and the ANTLR lexer are imported by the tokenizer that needs them
+
+BATCH_THREADS = os.cpu_count() or 1
+# Joined configurations remembered by each TokenTable
+JOIN_CACHE_SIZE = int(os.getenv('JOIN_CACHE_SIZE', '4096'))
 
 class Tokenizer(ABC):
+    # The model name given to get_decoder
+    name = None
+
+    @property
+    def index_name(self):
+        """The name the corpus index stores this tokenizer's tokens under.
+        It changes whenever the same model name starts producing other tokens."""
+        return self.name
+
+    @functools.cached_property
+    def index_version(self):
+        """The version of the code and data the tokens come from; the corpus index
+        does not reuse tokens stored by another version"""
+        return None
+
     @abstractmethod
     def decode(self, input: List[Any]) -> str:
         pass
@@ -15,8 +36,22 @@ class Tokenizer(ABC):
     def encode(self, input: str) -> List[Any]:
         pass
 
+    @abstractmethod
+    def token_bytes(self, token: Any) -> bytes:
+        """The bytes of a single token"""
+        pass
+
+    def encode_batch(self, inputs: List[str], num_threads=BATCH_THREADS) -> List[List[Any]]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+            return list(executor.map(self.encode, inputs))
+
+    def decode_batch(self, inputs: List[List[Any]], num_threads=BATCH_THREADS) -> List[str]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+            return list(executor.map(self.decode, inputs))
+
 class TikTokenTokenizer(Tokenizer):
     def __init__(self, model_name: str):
+        import tiktoken
         self.enc = tiktoken.encoding_for_model(model_name)
 
     def decode(self, input: List[Any]) -> str:
@@ -25,6 +60,20 @@ class TikTokenTokenizer(Tokenizer):
     def encode(self, input: str) -> List[Any]:
         return self.enc.encode(input)
 
+    def token_bytes(self, token: Any) -> bytes:
+        return self.enc.decode_single_token_bytes(token)
+
+    @functools.cached_property
+    def index_version(self):
+        from importlib.metadata import version
+        return f"{self.enc.name}:{version('tiktoken')}"
+
+    def encode_batch(self, inputs: List[str], num_threads=BATCH_THREADS) -> List[List[Any]]:
+        return self.enc.encode_batch(inputs, num_threads=num_threads)
+
+    def decode_batch(self, inputs: List[List[Any]], num_threads=BATCH_THREADS) -> List[str]:
+        return self.enc.decode_batch(inputs, num_threads=num_threads)
+
 class GPT4OTokenizer(TikTokenTokenizer):
     def __init__(self):
         super().__init__('gpt-4o')
@@ -35,6 +84,8 @@ class GPT4OMiniTokenizer(TikTokenTokenizer):
 
 class LLAMATokenizer(Tokenizer):
     def __init__(self):
+        from importlib import resources
+        import llama_models.llama3.api
         self.model_path = resources.files(llama_models.llama3.api) / 'tokenizer.model'
         self.tokenizer = llama_models.llama3.api.Tokenizer(str(self.model_path))
 
@@ -44,15 +95,98 @@ class LLAMATokenizer(Tokenizer):
     def encode(self, input: str) -> List[Any]:
         return self.tokenizer.encode(input, bos=False, eos=False)
 
+    def token_bytes(self, token: Any) -> bytes:
+        # The llama 3 tokenizer is a tiktoken encoding
+        return self.tokenizer.model.decode_single_token_bytes(token)
+
+    @functools.cached_property
+    def index_version(self):
+        from importlib.metadata import version
+        return f"{version('llama_models')}:{version('tiktoken')}"
+
+    def decode_batch(self, inputs: List[List[Any]], num_threads=BATCH_THREADS) -> List[str]:
+        return self.tokenizer.model.decode_batch(inputs, num_threads=num_threads)
+
 class Java8Tokenizer(Tokenizer):
+    """Java8Lexer tokens, from the regex lexer of regex_tokenize, or from the ANTLR lexer if EXACT"""
+    def __init__(self, exact=False):
+        self.exact = exact
+
+    @property
+    def index_name(self):
+        # Tokens stored under 'java8' came from the ANTLR lexer, before 'java8' meant the regex lexer
+        return None if self.name is None else 'java8' if self.exact else 'java8-regex'
+
+    @functools.cached_property
+    def index_version(self):
+        # The lexer's code and the grammar it was built from
+        from build_manifest import digest_bytes, digest_file
+        if self.exact:
+            import antlr_tokenize, Java8Lexer
+            files = [antlr_tokenize.__file__, Java8Lexer.__file__]
+        else:
+            import regex_tokenize
+            files = [regex_tokenize.__file__, regex_tokenize.GRAMMAR_PATH]
+        return digest_bytes(''.join(digest_file(os.path.realpath(f)) for f in files).encode('utf-8'))
+
     def decode(self, input: List[Any]) -> str:
         return ''.join(map(lambda i: i[1], input))
 
     def encode(self, input: str) -> List[Any]:
+        if self.exact:
+            from antlr_tokenize import tokenize as java_tokenize
+        else:
+            from regex_tokenize import tokenize as java_tokenize
         return java_tokenize(input)
 
+    def encode_batch(self, inputs: List[str], num_threads=BATCH_THREADS) -> List[List[Any]]:
+        if not self.exact:
+            # The regex lexer is quicker than starting a process pool
+            return list(map(self.encode, inputs))
+        # The lexer is pure Python, so threads would wait on each other
+        from antlr_tokenize import tokenize_batch
+        return tokenize_batch(inputs, jobs=num_threads)
 
-def get_decoder(model: str) -> Tokenizer:
+    def token_bytes(self, token: Any) -> bytes:
+        return token[1].encode('utf-8')
+
+
+class TokenTable:
+    """The text of each token of one input, computed once, to join subsets of them quickly.
+
+    A token holding a whole UTF-8 character sequence is kept as a str, so
+    joining such tokens is a str join. A token that splits a multi-byte
+    character only makes sense together with its neighbours: a subset with
+    one of them is joined as bytes and decoded like Tokenizer.decode, which
+    replaces the bytes of broken characters.
+    """
+
+    def __init__(self, decoder: Tokenizer, tokens: List[Any], cache_size=JOIN_CACHE_SIZE):
+        self.data = [decoder.token_bytes(token) for token in tokens]
+        self.text = list()
+        self.split = set()
+        for i, data in enumerate(self.data):
+            try:
+                self.text.append(data.decode('utf-8'))
+            except UnicodeDecodeError:
+                self.text.append(None)
+                self.split.add(i)
+        self.join = functools.lru_cache(maxsize=cache_size)(self._join)
+
+    def _join(self, indices: Tuple[int, ...]) -> str:
+        split = not self.split.isdisjoint(indices)
+        table = self.data if split else self.text
+        # itemgetter returns a tuple only for two or more items
+        parts = operator.itemgetter(*indices)(table) if len(indices) > 1 else [table[i] for i in indices]
+        if split:
+            return b''.join(parts).decode('utf-8', errors='replace')
+        return ''.join(parts)
+
+
+_decoders: Dict[str, Tokenizer] = dict()
+_decoders_lock = threading.Lock()
+
+def new_decoder(model: str) -> Tokenizer:
     match model:
         case 'gpt-4o':
             return GPT4OTokenizer()
@@ -62,4 +196,15 @@ def get_decoder(model: str) -> Tokenizer:
             return LLAMATokenizer()
         case 'java8':
             return Java8Tokenizer()
-    raise Exception(f"Cannot match model {model}")
\ No newline at end of file
+        case 'java8-antlr':
+            return Java8Tokenizer(exact=True)
+    raise Exception(f"Cannot match model {model}")
+
+def get_decoder(model: str) -> Tokenizer:
+    """The tokenizer of MODEL, created once per process and shared"""
+    with _decoders_lock:
+        decoder = _decoders.get(model)
+        if decoder is None:
+            decoder = _decoders[model] = new_decoder(model)
+            decoder.name = model
+    return decoder
@@ -6,6 +6,8 @@ import os
 import random
 import re
 
+from build_manifest import BuildManifest, digest_file
+
 def get_java_files(input_folder):
     return [f for f in os.listdir(input_folder) if f.endswith('.java')]
 
@@ -40,24 +42,29 @@ def add_comment_to_java_code(java_source):
     return '\n'.join(transformed_lines)
 
 
-def process_java_file(input_folder, output_folder, java_file):
+def get_recipe():
+    """Identity of this transformation: its name and the digest of this file, which implements it"""
+    return {'transform': 'add_commented_out_keywords', 'code': digest_file(os.path.realpath(__file__))}
+
+
+def process_java_file(input_folder, manifest, java_file):
     input_path = os.path.join(input_folder, java_file)
-    output_path = os.path.join(output_folder, java_file)
-    if os.path.exists(output_path):
+    if manifest.is_up_to_date(java_file, [input_path]):
         return
 
     input_str = read_file(input_path)
     response = add_comment_to_java_code(input_str)
-    write_file(output_path, response)
+    manifest.write(java_file, response, [input_path])
     print(f"{response}")
 
 def process_files(input_folder, output_folder):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
+    manifest = BuildManifest(output_folder, get_recipe())
 
     java_files = get_java_files(input_folder)
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        for java_file, process_result in zip(java_files, executor.map(lambda java_file: process_java_file(input_folder, output_folder, java_file), java_files)):
+        for java_file, process_result in zip(java_files, executor.map(lambda java_file: process_java_file(input_folder, manifest, java_file), java_files)):
             print(f"Processed {java_file}")
 
 
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import argparse
+import concurrent.futures
+import os
+
+import java_transform
+from build_manifest import BuildManifest, write_atomic
+import transform_add_commented_out_keywords
+
+# Stages run by BatchTransform inside the JVM
+JAVA_STAGES = {
+    'lowering': 'Lowering',
+    'lowering-numbered': 'Lowering:numbered',
+    'rename': 'RenameVariables',
+    'remove-comments': 'RemoveComments',
+    'reorder': 'ReorderClass',
+}
+# Stages run in this process
+PYTHON_STAGES = {
+    'keywords': transform_add_commented_out_keywords.add_comment_to_java_code,
+}
+
+
+def read_file(filepath):
+    with open(filepath, 'r') as file:
+        return file.read()
+
+
+def group_stages(stages):
+    """Split STAGES into runs: consecutive Java stages are fused into one BatchTransform call."""
+    groups = list()
+    for stage in stages:
+        if stage in JAVA_STAGES and groups and groups[-1][0] == 'java':
+            groups[-1][1].append(stage)
+        else:
+            groups.append(('java' if stage in JAVA_STAGES else 'python', [stage]))
+    return groups
+
+
+def run_stages(stages, codes, classpath):
+    """Apply STAGES to CODES (file name -> source code).
+    Returns file name -> (list of the output of every stage, or None, error message)."""
+    results = {java_file: ([], None) for java_file in codes}
+    current = dict(codes)
+    for kind, group in group_stages(stages):
+        if kind == 'java':
+            spec = ','.join(JAVA_STAGES[stage] for stage in group)
+            statuses = java_transform.run_json_transform(spec, current, classpath)
+            for java_file, status in statuses.items():
+                if status['status'] != 'ok':
+                    results[java_file] = (None, status['message'])
+                    del current[java_file]
+                    continue
+                results[java_file][0].extend(status['stages'])
+                current[java_file] = status['stages'][-1]
+        else:
+            transform = PYTHON_STAGES[group[0]]
+            for java_file in list(current):
+                try:
+                    current[java_file] = transform(current[java_file])
+                except Exception as e:
+                    results[java_file] = (None, repr(e))
+                    del current[java_file]
+                    continue
+                results[java_file][0].append(current[java_file])
+    return results
+
+
+def process_files(input_folder, output_folder, stages, keep=None, classpath=java_transform.CLASSPATH, jobs=None):
+    """Apply STAGES to every Java file of INPUT_FOLDER in one pass, writing the last stage to OUTPUT_FOLDER.
+    KEEP maps a stage name to a folder where the output of that stage is kept as well."""
+    keep = keep or dict()
+    for folder in [output_folder, *keep.values()]:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+    java_stages = ','.join(JAVA_STAGES[stage] for stage in stages if stage in JAVA_STAGES)
+    recipe = java_transform.get_recipe(java_stages, classpath)
+    if any(stage in PYTHON_STAGES for stage in stages):
+        recipe['keywords_code'] = transform_add_commented_out_keywords.get_recipe()['code']
+    manifests = {stage: BuildManifest(folder, {**recipe, 'stages': stages[:stages.index(stage) + 1]})
+                 for stage, folder in keep.items()}
+    manifest = BuildManifest(output_folder, {**recipe, 'stages': stages})
+
+    java_files = [f for f in java_transform.get_java_files(input_folder)
+                  if not (manifest.is_up_to_date(f, [os.path.join(input_folder, f)])
+                          and all(m.is_up_to_date(f, [os.path.join(input_folder, f)]) for m in manifests.values()))]
+    if not java_files:
+        return
+
+    def process_chunk(chunk):
+        codes = {java_file: read_file(os.path.join(input_folder, java_file)) for java_file in chunk}
+        return run_stages(stages, codes, classpath)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for results in executor.map(process_chunk, java_transform.chunk(java_files, jobs)):
+            for java_file, (outputs, message) in results.items():
+                if outputs is None:
+                    print(f"Error during execution: {java_file}: {message}")
+                    continue
+                input_path = os.path.join(input_folder, java_file)
+                for stage, output in zip(stages, outputs):
+                    if stage in manifests:
+                        manifests[stage].write(java_file, output, [input_path])
+                manifest.write(java_file, outputs[-1], [input_path])
+                print(f"Processed {java_file}")
+
+
+def parse_keep(value):
+    stage, _, folder = value.partition('=')
+    if stage not in JAVA_STAGES and stage not in PYTHON_STAGES or not folder:
+        raise argparse.ArgumentTypeError(f"Expected STAGE=FOLDER, got {value}")
+    return stage, folder
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply several transformations to a folder of Java files in one pass.")
+    parser.add_argument('--keep', type=parse_keep, action='append', default=[], metavar='STAGE=FOLDER',
+                        help='Also write the output of STAGE to FOLDER')
+    parser.add_argument('--classpath', default=java_transform.CLASSPATH)
+    parser.add_argument('--jobs', type=int, default=None, help='Number of JVMs (default: number of cores)')
+    parser.add_argument('input_folder')
+    parser.add_argument('output_folder')
+    parser.add_argument('stages', nargs='+', choices=sorted([*JAVA_STAGES, *PYTHON_STAGES]))
+    args = parser.parse_args()
+
+    keep = dict(args.keep)
+    unknown = [stage for stage in keep if stage not in args.stages]
+    if unknown:
+        parser.error(f"--keep names stages that are not run: {', '.join(unknown)}")
+    process_files(args.input_folder, args.output_folder, args.stages, keep, args.classpath, args.jobs)